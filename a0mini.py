@@ -1,85 +1,880 @@
 import asyncio
+import atexit
+import heapq
+import itertools
 import json
+import math
 import os
+import queue
+import re
+import sqlite3
 import subprocess
 import sys
-from datetime import datetime
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict, deque
 from typing import Any
 
 import agents
+import httpx
 import openai
 
+import history
+import metrics
+import replay
+import terminal
+import toolcache
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def tokenize(text: str) -> list:
+    """Split text into lowercase word tokens for indexing."""
+    return re.findall(r"\w+", text.lower())
+
+
+class KeywordIndex:
+    """
+    Inverted token index with BM25 ranking.
+    
+    Postings are updated incrementally as documents are added, so a query
+    only touches the documents that share a token with it. A token found in
+    more than `candidates` documents adds only its most recent ones as new
+    candidates, while documents found through rarer tokens still get its
+    full score, so a common word cannot make a query walk most of the index.
+    """
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75, candidates: int = 500):
+        self.k1 = k1
+        self.b = b
+        self.candidates = candidates
+        self.postings = {}
+        self.lengths = {}
+        self.total_length = 0
+    
+    def add(self, doc_id: int, text: str):
+        """Index a document under the given id."""
+        tokens = tokenize(text)
+        self.lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+        for token, count in Counter(tokens).items():
+            self.postings.setdefault(token, {})[doc_id] = count
+    
+    def remove(self, doc_id: int, text: str):
+        """Drop a document previously indexed with the same text."""
+        self.total_length -= self.lengths.pop(doc_id)
+        for token in set(tokenize(text)):
+            posting = self.postings[token]
+            del posting[doc_id]
+            if not posting:
+                del self.postings[token]
+    
+    def search(self, query: str, limit: int = 5) -> list:
+        """Return up to `limit` document ids, best match first."""
+        count = len(self.lengths)
+        postings = sorted((self.postings[token] for token in set(tokenize(query)) if token in self.postings), key=len)
+        if not count or not postings or limit <= 0:
+            return []
+        average = self.total_length / count
+        # The BM25 length norm k1 * (1 - b + b * length / average) as base + scale * length
+        base, scale = self.k1 * (1 - self.b), self.k1 * self.b / average
+        weights = [math.log(1 + (count - len(p) + 0.5) / (len(p) + 0.5)) for p in postings]
+        remaining = sum(weights) * (self.k1 + 1)
+        scores = {}
+        for posting, idf in zip(postings, weights):
+            # Rare terms come first. Once the terms left cannot lift an unseen
+            # document into the top results, the common ones only update the
+            # existing candidates instead of scoring their long postings.
+            if len(scores) >= limit and heapq.nlargest(limit, scores.values())[-1] >= remaining:
+                docs = [doc_id for doc_id in scores if doc_id in posting]
+            elif len(posting) > self.candidates:
+                # Postings are in insertion order, so the most recent documents come last
+                docs = dict.fromkeys(itertools.islice(reversed(posting), self.candidates))
+                docs.update(dict.fromkeys(doc_id for doc_id in scores if doc_id in posting))
+            else:
+                docs = posting
+            remaining -= idf * (self.k1 + 1)
+            weight, lengths = idf * (self.k1 + 1), self.lengths
+            for doc_id in docs:
+                frequency = posting[doc_id]
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * frequency / (frequency + base + scale * lengths[doc_id])
+        # Ties go to the most recent document
+        return heapq.nlargest(limit, scores, key=lambda doc_id: (scores[doc_id], doc_id))
+
+
+def embed(text: str, dimensions: int = 256):
+    """
+    Embed text offline as hashed word and character trigram features.
+    
+    Args:
+        text (str): Text to embed
+        dimensions (int): Size of the embedding vector
+    
+    Returns:
+        numpy.ndarray: L2-normalized float32 vector
+    """
+    words = tokenize(text)
+    padded = f" {' '.join(words)} "
+    features = words + [padded[i:i + 3] for i in range(len(padded) - 2)]
+    hashes = numpy.array([zlib.crc32(f.encode("utf-8")) for f in features], dtype=numpy.uint32)
+    # The top hash bit picks the sign so colliding features tend to cancel out
+    signs = numpy.where(hashes >> 31, -1.0, 1.0)
+    vector = numpy.bincount(hashes % dimensions, weights=signs, minlength=dimensions).astype(numpy.float32)
+    norm = numpy.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class VectorIndex:
+    """
+    Embedding index answering top-k cosine similarity queries.
+    
+    Embeddings live in one contiguous, preallocated matrix that doubles in
+    size when full, so a query is a single matrix-vector product.
+    """
+    
+    def __init__(self, dimensions: int = 256, capacity: int = 1024, embedding=embed):
+        if numpy is None:
+            raise ImportError("VectorIndex requires numpy. Install with: pip install numpy")
+        self.dimensions = dimensions
+        self.embedding = embedding
+        self.matrix = numpy.zeros((capacity, dimensions), dtype=numpy.float32)
+        self.ids = numpy.zeros(capacity, dtype=numpy.int64)
+        self.rows = {}
+        self.count = 0
+    
+    def add(self, doc_id: int, text: str):
+        """Embed and index a document under the given id."""
+        if self.count == len(self.matrix):
+            capacity = max(1, 2 * len(self.matrix))
+            matrix = numpy.zeros((capacity, self.dimensions), dtype=numpy.float32)
+            matrix[:self.count] = self.matrix[:self.count]
+            ids = numpy.zeros(capacity, dtype=numpy.int64)
+            ids[:self.count] = self.ids[:self.count]
+            self.matrix, self.ids = matrix, ids
+        self.matrix[self.count] = self.embedding(text, self.dimensions)
+        self.ids[self.count] = doc_id
+        self.rows[doc_id] = self.count
+        self.count += 1
+    
+    def remove(self, doc_id: int, text: str = None):
+        """Drop a document by moving the last row into its place."""
+        row = self.rows.pop(doc_id)
+        self.count -= 1
+        if row != self.count:
+            self.matrix[row] = self.matrix[self.count]
+            self.ids[row] = self.ids[self.count]
+            self.rows[int(self.ids[row])] = row
+    
+    def search(self, query: str, limit: int = 5) -> list:
+        """Return up to `limit` document ids, most similar first."""
+        if not self.count or limit <= 0:
+            return []
+        scores = self.matrix[:self.count] @ self.embedding(query, self.dimensions)
+        limit = min(limit, self.count)
+        top = numpy.argpartition(-scores, limit - 1)[:limit]
+        top = top[numpy.argsort(-scores[top], kind="stable")]
+        return [int(self.ids[i]) for i in top if scores[i] > 0]
+
+
+class MemoryStore:
+    """
+    On-disk log of memory records in a SQLite database in WAL mode.
+    
+    The database is opened on first use and appended records are buffered,
+    then committed in batches so writes do not sync on every call.
+    """
+    
+    def __init__(self, path: str, batch_size: int = 32):
+        self.path = path
+        self.batch_size = batch_size
+        self.connection = None
+        self.pending = []
+    
+    def connect(self) -> sqlite3.Connection:
+        """Open the database and create the log table if needed."""
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS log (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, data TEXT NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS log_kind ON log (kind, id)")
+        return self.connection
+    
+    def append(self, kind: str, record: dict):
+        """Queue a record for writing, flushing once a batch is full."""
+        self.pending.append((kind, json.dumps(record)))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Write all queued records in a single transaction."""
+        if self.pending:
+            with self.connect() as connection:
+                connection.executemany("INSERT INTO log (kind, data) VALUES (?, ?)", self.pending)
+            self.pending = []
+    
+    def read(self, kind: str):
+        """Yield the stored records of one kind in insertion order."""
+        self.flush()
+        for (data,) in self.connect().execute("SELECT data FROM log WHERE kind = ? ORDER BY id", (kind,)):
+            yield json.loads(data)
+    
+    def close(self):
+        """Flush queued records and close the database."""
+        self.flush()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class Record:
+    """Compact record base class, fields are declared in `__slots__`."""
+    
+    __slots__ = ()
+    
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+    
+    def __getitem__(self, name: str):
+        return getattr(self, name)
+    
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+    
+    def to_dict(self) -> dict:
+        """Return the record fields as a plain dictionary."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class MemoryRecord(Record):
+    """A stored memory with an epoch timestamp."""
+    
+    __slots__ = ("content", "timestamp", "metadata")
+
+
+class SolutionRecord(Record):
+    """A stored solution with an epoch timestamp."""
+    
+    __slots__ = ("problem", "solution", "success", "timestamp")
+
+
+class LogRecord(Record):
+    """A log entry with an epoch timestamp."""
+    
+    __slots__ = ("timestamp", "level", "message", "agent_id")
+
+
+class BoundedRecords:
+    """
+    Mapping of ids to records with an optional capacity and eviction policy.
+    
+    Policies:
+    - 'lru': evict the least recently used record
+    - 'lfu': evict the least frequently used record
+    - 'ttl': evict the oldest record, and expire records older than `ttl` seconds
+    
+    Records are evicted through `on_evict(key, record)` so indexes can follow.
+    """
+    
+    def __init__(self, capacity: int = None, policy: str = "lru", ttl: float = None, on_evict=None):
+        if policy not in ("lru", "lfu", "ttl"):
+            raise ValueError(f"Unknown eviction policy '{policy}'. Use 'lru', 'lfu' or 'ttl'.")
+        self.capacity = capacity
+        self.policy = policy
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.records = OrderedDict()
+        self.hits = {}
+        self.heap = []
+    
+    def __len__(self) -> int:
+        return len(self.records)
+    
+    def __iter__(self):
+        return iter(self.records.values())
+    
+    def __getitem__(self, key: int):
+        return self.records[key]
+    
+    def __contains__(self, key: int) -> bool:
+        return key in self.records
+    
+    def add(self, key: int, record: Record):
+        """Insert a record, evicting others first if the capacity is reached."""
+        self.expire()
+        while self.capacity is not None and self.records and len(self.records) >= self.capacity:
+            self.evict()
+        self.records[key] = record
+        if self.policy == "lfu":
+            self.hits[key] = 0
+            heapq.heappush(self.heap, (0, key))
+    
+    def touch(self, key: int):
+        """Record a use of the record for LRU and LFU bookkeeping."""
+        if key not in self.records:
+            return
+        if self.policy == "lru":
+            self.records.move_to_end(key)
+        elif self.policy == "lfu":
+            self.hits[key] += 1
+            heapq.heappush(self.heap, (self.hits[key], key))
+            if len(self.heap) > 4 * len(self.hits) + 64:
+                self.heap = [(hits, key) for key, hits in self.hits.items()]
+                heapq.heapify(self.heap)
+    
+    def expire(self):
+        """Drop records older than the time-to-live."""
+        if self.policy == "ttl" and self.ttl is not None:
+            deadline = time.time() - self.ttl
+            while self.records and next(iter(self.records.values())).timestamp < deadline:
+                self.evict()
+    
+    def evict(self):
+        """Remove one record chosen by the eviction policy."""
+        if self.policy == "lfu":
+            # Skip heap entries made stale by later hits or removals
+            while True:
+                hits, key = heapq.heappop(self.heap)
+                if self.hits.get(key) == hits:
+                    break
+            del self.hits[key]
+            record = self.records.pop(key)
+        else:
+            key, record = self.records.popitem(last=False)
+        if self.on_evict is not None:
+            self.on_evict(key, record)
+
+
+def footprint(value, seen: set = None) -> int:
+    """Approximate the memory used by an object graph in bytes."""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(footprint(k, seen) + footprint(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset, deque)):
+        size += sum(footprint(item, seen) for item in value)
+    elif isinstance(value, Record):
+        size += sum(footprint(getattr(value, name), seen) for name in value.__slots__)
+    elif isinstance(value, BoundedRecords):
+        size += footprint(value.records, seen) + footprint(value.hits, seen) + footprint(value.heap, seen)
+    elif numpy is not None and isinstance(value, numpy.ndarray):
+        size = value.nbytes
+    elif hasattr(value, "__dict__"):
+        size += footprint(vars(value), seen)
+    return size
+
 
 class AgentMemory:
-    """Simple in-memory storage for agent learning and context."""
+    """
+    Simple in-memory storage for agent learning and context.
+    
+    Memories are searched through a pluggable index, `KeywordIndex` by
+    default or `VectorIndex` for embedding similarity. With a `MemoryStore`
+    records survive restarts and are read back the first time they are used.
+    Memories and solutions are each limited to `capacity` records, evicted
+    by `policy` ('lru', 'lfu' or 'ttl' with `ttl` seconds). The last
+    `recent_limit` successful solutions are kept in a ring buffer.
+    """
     
-    def __init__(self):
-        self.memories = []
-        self.solutions = []
+    def __init__(self, index=None, store: MemoryStore = None, capacity: int = None, policy: str = "lru", ttl: float = None, recent_limit: int = 100):
+        self.index = index if index is not None else KeywordIndex()
+        self.memories = BoundedRecords(capacity, policy, ttl, on_evict=lambda key, record: self.index.remove(key, record.content))
+        self.solution_index = KeywordIndex()
+        self.solutions = BoundedRecords(capacity, policy, ttl, on_evict=lambda key, record: self.solution_index.remove(key, record.problem))
+        self.recent = deque(maxlen=recent_limit)
+        self.next_id = 0
+        self.store = store
+        self.loaded = set() if store is not None else {"memories", "solutions"}
+    
+    def load(self, kind: str):
+        """Read persisted records of one kind ('memories' or 'solutions') on first use."""
+        if kind in self.loaded:
+            return
+        self.loaded.add(kind)
+        for data in self.store.read(kind):
+            if kind == "memories":
+                self.insert_memory(MemoryRecord(**data))
+            else:
+                self.insert_solution(SolutionRecord(**data))
+    
+    def insert_memory(self, memory: MemoryRecord):
+        """Index and keep a memory record."""
+        self.index.add(self.next_id, memory.content)
+        self.memories.add(self.next_id, memory)
+        self.next_id += 1
+    
+    def insert_solution(self, solution: SolutionRecord):
+        """Index and keep a solution record."""
+        self.solution_index.add(self.next_id, solution.problem)
+        self.solutions.add(self.next_id, solution)
+        if solution.success:
+            self.recent.append(self.next_id)
+        self.next_id += 1
     
     def add_memory(self, content: str, metadata: dict = None):
         """Store a memory with optional metadata."""
-        memory = {
-            "content": content,
-            "timestamp": datetime.now().isoformat(),
-            "metadata": metadata or {}
-        }
-        self.memories.append(memory)
+        self.load("memories")
+        memory = MemoryRecord(content, time.time(), metadata or {})
+        self.insert_memory(memory)
+        if self.store is not None:
+            self.store.append("memories", memory.to_dict())
     
     def add_solution(self, problem: str, solution: str, success: bool = True):
         """Store a successful solution for future reference."""
-        self.solutions.append({
-            "problem": problem,
-            "solution": solution,
-            "success": success,
-            "timestamp": datetime.now().isoformat()
-        })
+        self.load("solutions")
+        solution = SolutionRecord(problem, solution, success, time.time())
+        self.insert_solution(solution)
+        if self.store is not None:
+            self.store.append("solutions", solution.to_dict())
     
     def search_memories(self, query: str, limit: int = 5) -> list:
-        """Simple search through memories (can be enhanced with vector search)."""
-        # Simple keyword matching for minimal implementation
-        results = [m for m in self.memories if query.lower() in m["content"].lower()]
-        return results[-limit:]
+        """Search memories ranked by index relevance, best match first."""
+        self.load("memories")
+        self.memories.expire()
+        results = []
+        for key in self.index.search(query, limit):
+            self.memories.touch(key)
+            results.append(self.memories[key])
+        return results
     
     def get_recent_solutions(self, limit: int = 3) -> list:
-        """Get recent successful solutions."""
-        return [s for s in self.solutions if s["success"]][-limit:]
+        """Get recent successful solutions, oldest first."""
+        self.load("solutions")
+        self.solutions.expire()
+        results = []
+        # Walk the ring buffer from the newest entry, skipping evicted solutions
+        for key in reversed(self.recent):
+            if len(results) >= limit:
+                break
+            if key in self.solutions:
+                results.append(self.solutions[key])
+        return results[::-1]
+    
+    def search_solutions(self, query: str, limit: int = 3) -> list:
+        """Search solutions by problem description, best match first."""
+        self.load("solutions")
+        self.solutions.expire()
+        results = []
+        for key in self.solution_index.search(query, limit):
+            self.solutions.touch(key)
+            results.append(self.solutions[key])
+        return results
+    
+    def report(self) -> dict:
+        """Report record counts and approximate memory footprint in bytes."""
+        return {
+            "memories": len(self.memories),
+            "solutions": len(self.solutions),
+            "memory_bytes": footprint(self.memories),
+            "solution_bytes": footprint(self.solutions),
+            "index_bytes": footprint(self.index) + footprint(self.solution_index) + footprint(self.recent),
+        }
+    
+    def close(self):
+        """Flush pending writes to the store."""
+        if self.store is not None:
+            self.store.close()
+
+
+PYTHON_WORKER = """
+import json, os, sys, tempfile, traceback
+for name in sys.argv[1:]:
+    __import__(name)
+# Keep the protocol on private copies of stdin and stdout so snippets that
+# read input or write to the file descriptors directly cannot corrupt it
+requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+replies = os.fdopen(os.dup(1), "w", encoding="utf-8")
+os.dup2(os.open(os.devnull, os.O_RDWR), 0)
+# Flush print() per line so it interleaves with output written to the descriptors
+sys.stdout.reconfigure(line_buffering=True)
+cwd = os.getcwd()
+for line in requests:
+    # Point stdout and stderr at a fresh file for each run, so the output of
+    # subprocesses and C extensions is captured along with print()
+    with tempfile.TemporaryFile() as output:
+        os.dup2(output.fileno(), 1)
+        os.dup2(output.fileno(), 2)
+        error = None
+        try:
+            exec(compile(json.loads(line), "<string>", "exec"), {"__name__": "__main__", "__builtins__": __builtins__})
+        except BaseException as e:
+            error = "".join(traceback.format_exception(type(e), e, e.__traceback__.tb_next))
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.chdir(cwd)
+        output.seek(0)
+        text = output.read().decode("utf-8", "replace")
+    replies.write(json.dumps({"output": text, "error": error}) + "\\n")
+    replies.flush()
+"""
+
+
+class PythonWorker:
+    """A warm Python process that runs snippets sent over its stdin."""
+    
+    def __init__(self, preload: tuple = ()):
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", PYTHON_WORKER, *preload],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8"
+        )
+        self.replies = queue.SimpleQueue()
+        self.runs = 0
+        threading.Thread(target=self.read, daemon=True).start()
+    
+    def read(self):
+        """Forward reply lines from the worker, then `None` once it exits."""
+        for line in self.process.stdout:
+            self.replies.put(line)
+        self.replies.put(None)
+    
+    def run(self, code: str, timeout: float) -> dict:
+        """Run a snippet and return its reply, raising TimeoutError if it hangs."""
+        self.runs += 1
+        self.process.stdin.write(json.dumps(code) + "\n")
+        self.process.stdin.flush()
+        try:
+            reply = self.replies.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("Code execution timeout")
+        if reply is None:
+            raise RuntimeError("Python worker exited unexpectedly")
+        return json.loads(reply)
+    
+    def close(self):
+        """Stop the worker process."""
+        self.process.kill()
+        self.process.wait()
+
+
+class PythonWorkerPool:
+    """
+    Pool of pre-started Python workers for `execute_code`.
+    
+    Each snippet runs in a fresh namespace inside a warm interpreter, so it
+    skips interpreter startup and the imports listed in `preload`. A worker
+    is replaced after `max_runs` snippets, or when a snippet times out.
+    """
+    
+    def __init__(self, size: int = 2, preload: tuple = (), max_runs: int = 100, timeout: float = 30):
+        self.preload = tuple(preload)
+        self.max_runs = max_runs
+        self.timeout = timeout
+        self.idle = queue.Queue()
+        for _ in range(size):
+            self.idle.put(PythonWorker(self.preload))
+    
+    def run(self, code: str, timeout: float = None) -> str:
+        """
+        Run Python code on an idle worker.
+        
+        Args:
+            code (str): The code to execute
+            timeout (float): Seconds to wait before the worker is replaced
+        
+        Returns:
+            str: Output of the code, or an error message
+        """
+        worker = self.idle.get()
+        try:
+            reply = worker.run(code, timeout or self.timeout)
+        except (TimeoutError, RuntimeError, OSError) as e:
+            worker.runs = self.max_runs
+            return f"Error: {str(e)}"
+        finally:
+            if worker.runs >= self.max_runs or worker.process.poll() is not None:
+                worker.close()
+                worker = PythonWorker(self.preload)
+            self.idle.put(worker)
+        return reply["output"] if reply["error"] is None else f"Error: {reply['output']}{reply['error']}"
+    
+    def close(self):
+        """Stop all idle workers."""
+        while not self.idle.empty():
+            self.idle.get().close()
+
+
+LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+
+class LogWriter:
+    """
+    Writes log records from a background thread in batches.
+    
+    Callers only enqueue records, formatting and I/O happen on the writer
+    thread so logging never blocks the event loop. Records are appended as
+    JSON lines to `path` and echoed to the console unless `echo` is False.
+    Records still queued when the interpreter exits are written first.
+    """
+    
+    def __init__(self, path: str = None, level: str = "info", echo: bool = True, batch_size: int = 256):
+        self.path = path
+        self.level = LOG_LEVELS[level]
+        self.echo = echo
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.lock = threading.Lock()
+    
+    def enabled(self, level: str) -> bool:
+        """Check whether records of this level pass the level filter."""
+        return LOG_LEVELS.get(level, LOG_LEVELS["info"]) >= self.level
+    
+    def write(self, record: LogRecord):
+        """Queue a record for the writer thread."""
+        if not self.echo and self.path is None:
+            return
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, daemon=True)
+                    self.thread.start()
+                    # The daemon thread would be killed at exit with records still queued
+                    atexit.register(self.close)
+        self.queue.put(record)
+    
+    def run(self):
+        """Drain the queue in batches until a `None` record is received."""
+        file = open(self.path, "a", encoding="utf-8") if self.path else None
+        try:
+            running = True
+            while running:
+                batch = [self.queue.get()]
+                while len(batch) < self.batch_size and not self.queue.empty():
+                    batch.append(self.queue.get())
+                if None in batch:
+                    running = False
+                    batch = [record for record in batch if record is not None]
+                if file is not None:
+                    file.write("".join(json.dumps(record.to_dict()) + "\n" for record in batch))
+                    file.flush()
+                if self.echo and batch:
+                    sys.stdout.write("".join(f"[Agent {record.agent_id}] {record.message}\n" for record in batch))
+                    sys.stdout.flush()
+        finally:
+            if file is not None:
+                file.close()
+    
+    def close(self):
+        """Write all queued records and stop the writer thread."""
+        with self.lock:
+            if self.thread is not None:
+                self.queue.put(None)
+                self.thread.join()
+                self.thread = None
+                atexit.unregister(self.close)
 
 
 class AgentContext:
     """Manages agent execution context, including memory and hierarchy."""
     
-    def __init__(self, agent_id: int = 0, parent=None):
+    def __init__(
+        self,
+        agent_id: int = 0,
+        parent=None,
+        memory: AgentMemory = None,
+        log_capacity: int = 1000,
+        log_writer: LogWriter = None,
+        agent: agents.Agent = None,
+        max_concurrency: int = 4,
+        max_depth: int = 3,
+        python_pool: PythonWorkerPool = None,
+        recorder: metrics.Recorder = None,
+        tool_cache: toolcache.ToolCache = None,
+        max_parallel_tools: int = terminal.PARALLEL_TOOLS
+    ):
         self.agent_id = agent_id
         self.parent = parent
-        self.memory = AgentMemory()
-        self.logs = []
+        self.memory = memory if memory is not None else AgentMemory()
+        self.logs = deque(maxlen=log_capacity)
+        self.log_writer = log_writer if log_writer is not None else LogWriter()
+        # A writer made here is closed with this context, subordinates share their parent's
+        self.owns_log_writer = log_writer is None
         self.subordinates = []
+        # Subordinates leave `subordinates` when their task ends, ids keep counting
+        self.subordinate_count = 0
+        # Delegation state, the semaphore is shared by the whole agent tree
+        self.agent = agent if agent is not None else getattr(parent, "agent", None)
+        self.semaphore = parent.semaphore if parent is not None else asyncio.Semaphore(max_concurrency)
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.max_depth = max_depth
+        self.running = False
+        # Delegations this running agent waits on, it gives up its slot for the first one
+        self.waiting = 0
+        self.waiting_lock = asyncio.Lock()
+        self.tasks = set()
+        self.python_pool = python_pool if python_pool is not None else getattr(parent, "python_pool", None)
+        self.shell = None
+        # Tools start the shell from worker threads
+        self.shell_lock = threading.Lock()
+        self.recorder = recorder if recorder is not None else getattr(parent, "recorder", None)
+        # Results of read-only commands, shared by the whole agent tree
+        self.tool_cache = tool_cache if tool_cache is not None else getattr(parent, "tool_cache", None) or toolcache.ToolCache(0)
+        # Blocking tools run on threads, at most `max_parallel_tools` per agent
+        self.max_parallel_tools = max_parallel_tools
+        self.tool_slots = asyncio.Semaphore(max_parallel_tools)
     
     def log(self, message: str, level: str = "info"):
-        """Log a message with timestamp."""
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "level": level,
-            "message": message,
-            "agent_id": self.agent_id
-        }
-        self.logs.append(log_entry)
-        print(f"[Agent {self.agent_id}] {message}")
+        """Log a message with timestamp, keeping the most recent `log_capacity` entries."""
+        # Filter before building the record so disabled levels cost nothing
+        if not self.log_writer.enabled(level):
+            return
+        record = LogRecord(time.time(), level, message, self.agent_id)
+        self.logs.append(record)
+        self.log_writer.write(record)
     
     def create_subordinate(self):
         """Create a subordinate agent context."""
-        subordinate_id = len(self.subordinates)
+        subordinate_id = self.subordinate_count
+        self.subordinate_count += 1
         subordinate = AgentContext(
             agent_id=f"{self.agent_id}.{subordinate_id}",
-            parent=self
+            parent=self,
+            log_capacity=self.logs.maxlen,
+            log_writer=self.log_writer,
+            max_depth=self.max_depth,
+            max_parallel_tools=self.max_parallel_tools
         )
         self.subordinates.append(subordinate)
         return subordinate
+    
+    async def delegate(self, task: str, context: str = "") -> str:
+        """
+        Run a task on a new subordinate agent and return its final output.
+        
+        At most `max_concurrency` subordinates of the tree run at once.
+        
+        Args:
+            task (str): Description of the task to delegate
+            context (str): Additional context for the subordinate agent
+        
+        Returns:
+            str: Final output of the subordinate agent
+        """
+        result = (await self.delegate_many([task], context))[0]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+    
+    async def delegate_many(self, tasks: list, context: str = "") -> list:
+        """
+        Run tasks concurrently on new subordinate agents and gather their outputs.
+        
+        A failing task does not discard the results of the others, its entry
+        is the exception it raised. Cancelling the caller cancels every
+        subordinate still running. Subordinates are dropped from
+        `subordinates` once their tasks are over.
+        
+        Args:
+            tasks (list): Descriptions of the tasks to delegate
+            context (str): Additional context shared by the subordinate agents
+        
+        Returns:
+            list: Final outputs of the subordinate agents, or the exceptions
+            they raised, in task order
+        """
+        if self.agent is None:
+            raise ValueError("No agent configured for delegation.")
+        if self.depth >= self.max_depth:
+            raise ValueError(f"Delegation depth limit of {self.max_depth} reached. Complete the task directly.")
+        children, subordinates = [], []
+        for task in tasks:
+            subordinate = self.create_subordinate()
+            child = asyncio.create_task(subordinate.run_task(task, context))
+            self.tasks.add(child)
+            child.add_done_callback(self.tasks.discard)
+            children.append(child)
+            subordinates.append(subordinate)
+        # Give up this agent's slot while waiting so nested delegation
+        # cannot exhaust the semaphore and deadlock the tree. Parallel tool
+        # calls of one turn share the slot, so only the first wait releases
+        # it and only the last one takes it back.
+        if self.running:
+            async with self.waiting_lock:
+                self.waiting += 1
+                if self.waiting == 1:
+                    self.semaphore.release()
+        try:
+            results = await asyncio.gather(*children, return_exceptions=True)
+        finally:
+            for child in children:
+                child.cancel()
+            for subordinate in subordinates:
+                self.subordinates.remove(subordinate)
+            if self.running:
+                async with self.waiting_lock:
+                    self.waiting -= 1
+                    if self.waiting == 0:
+                        await self.semaphore.acquire()
+        for task, result in zip(tasks, results):
+            if isinstance(result, BaseException):
+                self.log(f"Task failed: {task}: {result!r}", level="error")
+        return results
+    
+    async def run_task(self, task: str, context: str = "") -> str:
+        """Run the agent on a task within this context, holding a concurrency slot."""
+        prompt = f"You are subordinate agent {self.agent_id}. Complete this task and report the result to your superior.\n\nTask: {task}"
+        if context:
+            prompt += f"\n\nContext: {context}"
+        async with self.semaphore:
+            self.running = True
+            try:
+                self.log(f"Started task: {task}")
+                result = await agents.Runner.run(self.agent, prompt, context=self, max_turns=50, hooks=self.recorder)
+                self.log("Finished task")
+                return str(result.final_output)
+            finally:
+                self.running = False
+                self.close()
+    
+    def shell_session(self) -> terminal.ShellSession:
+        """Return this agent's persistent shell, started on first use, or None if bash is unavailable."""
+        with self.shell_lock:
+            if self.shell is None and terminal.ShellSession.available():
+                self.shell = terminal.ShellSession(echo=True)
+            return self.shell
+    
+    def close(self):
+        """Stop the shells of this agent and its subordinates, and flush a log writer it created."""
+        if self.shell is not None:
+            self.shell.close()
+            self.shell = None
+        for subordinate in self.subordinates:
+            subordinate.close()
+        if self.owns_log_writer:
+            self.log_writer.close()
+    
+    def cancel(self):
+        """Cancel running subordinate tasks, including their own subordinates."""
+        for task in list(self.tasks):
+            task.cancel()
+        for subordinate in self.subordinates:
+            subordinate.cancel()
+
+
+def tool_slots(ctx: agents.RunContextWrapper[AgentContext], *args, **kwargs) -> asyncio.Semaphore:
+    return ctx.context.tool_slots
 
 
 @agents.tool.function_tool
-def execute_code(language: str, code: str) -> str:
+@terminal.offload(tool_slots)
+def execute_code(ctx: agents.RunContextWrapper[AgentContext], language: str, code: str) -> str:
     """
     Execute code in the specified language.
     Supports Python and shell scripts.
@@ -93,14 +888,18 @@ def execute_code(language: str, code: str) -> str:
     """
     print(f"\n🔧 \033[32mExecuting {language} code\033[0m")
     
-    if language.lower() == "python":
+    # Code may change any file, so cached command output cannot be trusted
+    ctx.context.tool_cache.invalidate_commands()
+    
+    if language.lower() == "python" and ctx.context.python_pool is not None:
+        return terminal.truncate(ctx.context.python_pool.run(code))
+    
+    elif language.lower() == "python":
         try:
-            result = subprocess.run(
+            result = terminal.run(
                 [sys.executable, "-c", code],
-                capture_output=True,
-                text=True,
                 timeout=30,
-                check=False
+                echo=True
             )
             return result.stdout if result.returncode == 0 else f"Error: {result.stderr}"
         except subprocess.TimeoutExpired:
@@ -110,13 +909,11 @@ def execute_code(language: str, code: str) -> str:
     
     elif language.lower() in ("bash", "shell", "sh"):
         try:
-            result = subprocess.run(
+            result = terminal.run(
                 code,
                 shell=True,
-                capture_output=True,
-                text=True,
                 timeout=30,
-                check=False
+                echo=True
             )
             return result.stdout if result.returncode == 0 else f"Error: {result.stderr}"
         except subprocess.TimeoutExpired:
@@ -129,9 +926,12 @@ def execute_code(language: str, code: str) -> str:
 
 
 @agents.tool.function_tool
-def terminal_command(command: str) -> str:
+@terminal.offload(tool_slots)
+def terminal_command(ctx: agents.RunContextWrapper[AgentContext], command: str) -> str:
     """
     Execute a terminal command.
+    The shell is persistent, so the working directory and environment carry over between commands.
+    Commands share this one shell and run one at a time.
     
     Args:
         command (str): The terminal command to execute
@@ -140,16 +940,35 @@ def terminal_command(command: str) -> str:
         str: Output from the command
     """
     print(f"\n💻 \033[32mRunning: {command}\033[0m")
+    cache = ctx.context.tool_cache
+    key = ("terminal", ctx.context.agent_id, command)
+    if toolcache.read_only(command):
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    else:
+        cache.invalidate_commands()
     try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=30,
-            check=False
-        )
-        return result.stdout if result.returncode == 0 else f"Exit code {result.returncode}: {result.stderr}"
+        shell = ctx.context.shell_session()
+        if shell is not None:
+            try:
+                result = shell.run(command, timeout=30)
+            except subprocess.TimeoutExpired:
+                return "Error: Command timeout, the shell was restarted"
+            directory = shell.directory()
+        else:
+            result = terminal.run(
+                command,
+                shell=True,
+                timeout=30,
+                echo=True
+            )
+            directory = os.getcwd()
+        if result.returncode != 0:
+            return f"Exit code {result.returncode}: {result.stderr}"
+        # Output is cached only when the files it was read from can be checked for changes
+        sources = toolcache.sources(command, directory) if toolcache.read_only(command) else None
+        return cache.put(key, result.stdout, sources, command=True) if sources is not None else result.stdout
     except subprocess.TimeoutExpired:
         return "Error: Command timeout"
     except Exception as e:
@@ -157,7 +976,7 @@ def terminal_command(command: str) -> str:
 
 
 @agents.tool.function_tool
-def store_memory(content: str, category: str = "general") -> str:
+async def store_memory(ctx: agents.RunContextWrapper[AgentContext], content: str, category: str = "general") -> str:
     """
     Store information in agent memory for future reference.
     
@@ -169,12 +988,12 @@ def store_memory(content: str, category: str = "general") -> str:
         str: Confirmation message
     """
     print(f"\n🧠 \033[32mStoring memory: {category}\033[0m")
-    # This would use the context's memory in actual implementation
+    ctx.context.memory.add_memory(content, {"category": category})
     return f"Memory stored successfully in category '{category}'"
 
 
 @agents.tool.function_tool
-def delegate_task(task_description: str, context: str = "") -> str:
+async def delegate_task(ctx: agents.RunContextWrapper[AgentContext], task_description: str, context: str = "") -> str:
     """
     Delegate a subtask to a subordinate agent.
     This creates a new agent instance to handle the specific subtask.
@@ -187,7 +1006,33 @@ def delegate_task(task_description: str, context: str = "") -> str:
         str: Result from the subordinate agent
     """
     print(f"\n👥 \033[32mDelegating task to subordinate agent\033[0m")
-    return f"Task '{task_description}' has been delegated. Subordinate agent will handle this subtask."
+    try:
+        return await ctx.context.delegate(task_description, context)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@agents.tool.function_tool
+async def delegate_tasks(ctx: agents.RunContextWrapper[AgentContext], task_descriptions: list[str], context: str = "") -> str:
+    """
+    Delegate independent subtasks to subordinate agents that work on them concurrently.
+    
+    Args:
+        task_descriptions (list of str): Descriptions of the independent tasks to delegate
+        context (str): Additional context shared by the subordinate agents
+    
+    Returns:
+        str: Results from the subordinate agents, one section per task
+    """
+    print(f"\n👥 \033[32mDelegating {len(task_descriptions)} tasks to subordinate agents\033[0m")
+    try:
+        results = await ctx.context.delegate_many(task_descriptions, context)
+    except Exception as e:
+        return f"Error: {str(e)}"
+    return "\n\n".join(
+        f"Task: {task}\nError: {result!r}" if isinstance(result, BaseException) else f"Task: {task}\nResult: {result}"
+        for task, result in zip(task_descriptions, results)
+    )
 
 
 class AgentZeroMini:
@@ -202,20 +1047,62 @@ class AgentZeroMini:
     - Fully customizable through prompts
     """
     
-    def __init__(self, model: str = "claude-opus-4-5", api_key: str = None):
-        self.context = AgentContext(agent_id=0)
+    def __init__(
+        self,
+        model: str = "claude-opus-4-5",
+        api_key: str = None,
+        memory: AgentMemory = None,
+        log_writer: LogWriter = None,
+        base_url: str = "https://api.anthropic.com/v1/",
+        max_connections: int = 20,
+        keepalive_expiry: float = 300.0,
+        max_subordinates: int = 4,
+        python_pool: PythonWorkerPool = None,
+        history_budget: int = 24000,
+        recorder: metrics.Recorder = None,
+        tool_cache: toolcache.ToolCache = None,
+        max_parallel_tools: int = terminal.PARALLEL_TOOLS
+    ):
+        self.recorder = recorder if recorder is not None else metrics.Recorder()
+        self.context = AgentContext(
+            agent_id=0,
+            memory=memory,
+            log_writer=log_writer,
+            max_concurrency=max_subordinates,
+            python_pool=python_pool,
+            recorder=self.recorder,
+            tool_cache=tool_cache,
+            max_parallel_tools=max_parallel_tools
+        )
         self.model = model
+        self.history_budget = history_budget
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
         
         if not self.api_key:
             raise ValueError("API key required. Set ANTHROPIC_API_KEY environment variable.")
         
+        # One client per instance so every turn and every subordinate agent
+        # reuses the same keep-alive connection pool and TLS sessions.
+        # The httpx client keeps its default timeout, which openai replaces
+        # with its own request timeout.
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.client = replay.connect(openai.AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=base_url,
+            http_client=httpx.AsyncClient(limits=limits, follow_redirects=True)
+        ))
+        
         # Setup the agent with tools
         self.tools = [
             execute_code,
             terminal_command,
             store_memory,
             delegate_task,
+            delegate_tasks,
             agents.WebSearchTool()
         ]
         
@@ -233,7 +1120,7 @@ Available Capabilities:
 - Execute Python code or shell commands to accomplish tasks
 - Search the web for information
 - Store and retrieve information from memory
-- Delegate subtasks to subordinate agents
+- Delegate subtasks to subordinate agents, independent subtasks run concurrently
 - Create and use any tools you need by writing code
 
 Approach:
@@ -244,6 +1131,26 @@ Approach:
 5. Store successful solutions for future reference
 
 Remember: You have the freedom to solve problems creatively. There are no hard-coded limitations on your approach."""
+        
+        self.agent = agents.Agent(
+            name="agent-zero",
+            instructions=self.instructions,
+            model=agents.OpenAIChatCompletionsModel(self.model, self.client),
+            model_settings=agents.ModelSettings(truncation="auto"),
+            tools=self.tools
+        )
+        self.context.agent = self.agent
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+    
+    async def close(self):
+        """Close the pooled HTTP connections, the agent shells and a log writer made for this agent."""
+        self.context.close()
+        await self.client.close()
     
     async def run(self, user_message: str) -> str:
         """
@@ -257,28 +1164,12 @@ Remember: You have the freedom to solve problems creatively. There are no hard-c
         """
         self.context.log(f"Processing user request: {user_message}")
         
-        # Create the OpenAI client
-        client = openai.AsyncOpenAI(
-            api_key=self.api_key,
-            base_url="https://api.anthropic.com/v1/"
-        )
-        
-        # Create agent instance
-        model_instance = agents.OpenAIChatCompletionsModel(self.model, client)
-        agent = agents.Agent(
-            name="agent-zero",
-            instructions=self.instructions,
-            model=model_instance,
-            model_settings=agents.ModelSettings(truncation="auto"),
-            tools=self.tools
-        )
-        
         # Run the agent
         messages = [{"role": "user", "content": user_message}]
-        stream = agents.Runner.run_streamed(agent, messages, max_turns=50)
+        stream = agents.Runner.run_streamed(self.agent, messages, context=self.context, max_turns=50, hooks=self.recorder)
         
         response = ""
-        async for event in stream.stream_events():
+        async for event in self.recorder.stream(stream):
             if event.type == 'raw_response_event' and event.data.type == "response.output_text.delta":
                 response += event.data.delta
                 print(event.data.delta, end="", flush=True)
@@ -293,7 +1184,9 @@ Remember: You have the freedom to solve problems creatively. There are no hard-c
         print("🤖 Agent Zero Mini - Ready!")
         print("Type 'quit' or 'exit' to end the session.\n")
         
-        messages = []
+        # Old turns are folded into a summary so each request stays within
+        # the token budget however long the session runs
+        messages = history.History(self.history_budget)
         
         while True:
             try:
@@ -308,34 +1201,18 @@ Remember: You have the freedom to solve problems creatively. There are no hard-c
                 
                 print("🤖 Agent Zero: ", end="", flush=True)
                 
-                # Create the OpenAI client
-                client = openai.AsyncOpenAI(
-                    api_key=self.api_key,
-                    base_url="https://api.anthropic.com/v1/"
-                )
-                
-                # Create agent instance
-                model_instance = agents.OpenAIChatCompletionsModel(self.model, client)
-                agent = agents.Agent(
-                    name="agent-zero",
-                    instructions=self.instructions,
-                    model=model_instance,
-                    model_settings=agents.ModelSettings(truncation="auto"),
-                    tools=self.tools
-                )
-                
-                messages.append({"role": "user", "content": user_input})
+                messages.append("user", user_input)
                 
                 # Run the agent with conversation history
-                stream = agents.Runner.run_streamed(agent, messages, max_turns=50)
+                stream = agents.Runner.run_streamed(self.agent, messages.messages(), context=self.context, max_turns=50, hooks=self.recorder)
                 
                 response = ""
-                async for event in stream.stream_events():
+                async for event in self.recorder.stream(stream):
                     if event.type == 'raw_response_event' and event.data.type == "response.output_text.delta":
                         response += event.data.delta
                         print(event.data.delta, end="", flush=True)
                 
-                messages.append({"role": "assistant", "content": response})
+                messages.append("assistant", response)
                 print("\n")  # New lines after response
                 
             except KeyboardInterrupt:
@@ -363,15 +1240,38 @@ async def main():
         elif model_name == 'gemini':
             model = "gemini-2.5-pro"
     
-    # Single prompt mode or interactive mode
-    if args:
-        # Single prompt mode
-        prompt = " ".join(args)
-        agent = AgentZeroMini(model=model)
-        await agent.run(prompt)
-    else:
-        # Interactive mode
-        print("""
+    # Persist memory across restarts when a database path is configured
+    memory_path = os.getenv("A0MINI_MEMORY")
+    memory = AgentMemory(store=MemoryStore(memory_path)) if memory_path else None
+    
+    # Opt-in warm Python workers for execute_code
+    python_workers = int(os.getenv("A0MINI_PYTHON_WORKERS", "0"))
+    python_preload = [name for name in os.getenv("A0MINI_PYTHON_PRELOAD", "").split(",") if name]
+    python_pool = PythonWorkerPool(python_workers, python_preload) if python_workers > 0 else None
+    
+    # Optional JSON lines log file, level filter and console echo
+    log_writer = LogWriter(
+        path=os.getenv("A0MINI_LOG"),
+        level=os.getenv("A0MINI_LOG_LEVEL", "info"),
+        echo=os.getenv("A0MINI_LOG_ECHO", "1") != "0"
+    )
+    
+    # Optional JSON lines metrics file, summarized at exit
+    recorder = metrics.Recorder(os.getenv("AGENT_METRICS"))
+    
+    # Opt-in cache of read-only command output
+    tool_cache = toolcache.from_env()
+    
+    try:
+        # Single prompt mode or interactive mode
+        if args:
+            # Single prompt mode
+            prompt = " ".join(args)
+            async with AgentZeroMini(model=model, memory=memory, log_writer=log_writer, python_pool=python_pool, recorder=recorder, tool_cache=tool_cache) as agent:
+                await agent.run(prompt)
+        else:
+            # Interactive mode
+            print("""
 ╔══════════════════════════════════════════════════════╗
 ║         🤖 Agent Zero Mini                          ║
 ║                                                      ║
@@ -382,8 +1282,16 @@ async def main():
 ║  - Multi-agent cooperation                          ║
 ╚══════════════════════════════════════════════════════╝
         """)
-        agent = AgentZeroMini(model=model)
-        await agent.interactive_loop()
+            history_budget = int(os.getenv("A0MINI_HISTORY_BUDGET", "24000"))
+            async with AgentZeroMini(model=model, memory=memory, log_writer=log_writer, python_pool=python_pool, history_budget=history_budget, recorder=recorder, tool_cache=tool_cache) as agent:
+                await agent.interactive_loop()
+    finally:
+        recorder.close()
+        log_writer.close()
+        if python_pool is not None:
+            python_pool.close()
+        if memory is not None:
+            memory.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for a0mini.py components.
+These run locally and do not require API keys.
+"""
+
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import agents
+import openai
+
+import a0mini
+import editor
+import replay
+
+
+def bench_memory_search(sizes=(1000, 10000, 100000), queries=200):
+    """Measure AgentMemory.search_memories latency as the store grows."""
+    print("AgentMemory.search_memories")
+    print(f"{'memories':>10} {'add (µs)':>10} {'search (µs)':>12} {'common (µs)':>12} {'top word (µs)':>14} {'bytes/memory':>13}")
+    rng = random.Random(0)
+    # Zipf-like vocabulary so a few words are common and most are rare
+    vocabulary = [f"word{i}" for i in range(20000)]
+    weights = [1 / (i + 1) for i in range(len(vocabulary))]
+    for size in sizes:
+        memory = a0mini.AgentMemory()
+        texts = [" ".join(rng.choices(vocabulary, weights, k=12)) for _ in range(size)]
+        start = time.perf_counter()
+        for text in texts:
+            memory.add_memory(text)
+        add_time = (time.perf_counter() - start) / size
+        # Typical queries use distinctive words, the common column draws query
+        # words with the same skew as the stored text, and the top word column
+        # pairs a distinctive word with one found in most memories
+        typical = [" ".join(rng.choices(vocabulary, k=2)) for _ in range(queries)]
+        common = [" ".join(rng.choices(vocabulary, weights, k=2)) for _ in range(queries)]
+        top = [f"{vocabulary[0]} {rng.choice(vocabulary)}" for _ in range(queries)]
+        times = []
+        for terms in (typical, common, top):
+            start = time.perf_counter()
+            for term in terms:
+                memory.search_memories(term)
+            times.append((time.perf_counter() - start) / queries)
+        report = memory.report()
+        per_memory = (report["memory_bytes"] + report["index_bytes"]) / size
+        print(f"{size:>10} {add_time * 1e6:>10.1f} {times[0] * 1e6:>12.1f} {times[1] * 1e6:>12.1f} {times[2] * 1e6:>14.1f} {per_memory:>13.0f}")
+
+
+def bench_vector_search(sizes=(1000, 10000, 100000), queries=200):
+    """Measure VectorIndex recall latency as the store grows."""
+    print("AgentMemory.search_memories with VectorIndex")
+    print(f"{'memories':>10} {'add (µs)':>10} {'search (µs)':>12}")
+    rng = random.Random(0)
+    vocabulary = [f"word{i}" for i in range(20000)]
+    for size in sizes:
+        memory = a0mini.AgentMemory(index=a0mini.VectorIndex())
+        texts = [" ".join(rng.choices(vocabulary, k=12)) for _ in range(size)]
+        start = time.perf_counter()
+        for text in texts:
+            memory.add_memory(text)
+        add_time = (time.perf_counter() - start) / size
+        terms = [" ".join(rng.choices(vocabulary, k=2)) for _ in range(queries)]
+        start = time.perf_counter()
+        for term in terms:
+            memory.search_memories(term)
+        search_time = (time.perf_counter() - start) / queries
+        print(f"{size:>10} {add_time * 1e6:>10.1f} {search_time * 1e6:>12.1f}")
+
+
+def bench_recent_solutions(sizes=(10, 1000, 100000, 1000000), queries=1000):
+    """Measure get_recent_solutions latency as solutions accumulate."""
+    print("AgentMemory.get_recent_solutions")
+    print(f"{'solutions':>10} {'lookup (µs)':>12}")
+    for size in sizes:
+        memory = a0mini.AgentMemory()
+        for i in range(size):
+            memory.add_solution(f"problem {i}", f"solution {i}", success=i % 3 != 0)
+        start = time.perf_counter()
+        for _ in range(queries):
+            memory.get_recent_solutions()
+        lookup_time = (time.perf_counter() - start) / queries
+        print(f"{size:>10} {lookup_time * 1e6:>12.2f}")
+
+
+async def first_token_latency(agent, messages) -> float:
+    """Stream one turn and return the seconds until the first text delta."""
+    start = time.perf_counter()
+    latency = None
+    stream = agents.Runner.run_streamed(agent, messages)
+    async for event in stream.stream_events():
+        if latency is None and event.type == "raw_response_event" and event.data.type == "response.output_text.delta":
+            latency = time.perf_counter() - start
+    return latency
+
+
+def bench_first_token(turns=20, handshake=0.05):
+    """Compare first-token latency of per-turn clients with the pooled client."""
+    print(f"First-token latency over {turns} turns ({handshake * 1000:.0f} ms simulated handshake)")
+    print(f"{'client':>10} {'mean (ms)':>10} {'p50 (ms)':>10} {'connections':>12}")
+    
+    def function_tools(tools):
+        # Hosted tools are not available through chat completions
+        return [tool for tool in tools if isinstance(tool, agents.FunctionTool)]
+    
+    async def per_turn(server):
+        latencies = []
+        zero = a0mini.AgentZeroMini(api_key="mock", base_url=server.base_url, log_writer=a0mini.LogWriter(echo=False))
+        for _ in range(turns):
+            client = openai.AsyncOpenAI(api_key="mock", base_url=server.base_url)
+            agent = agents.Agent(
+                name="agent-zero",
+                instructions=zero.instructions,
+                model=agents.OpenAIChatCompletionsModel(zero.model, client),
+                tools=function_tools(zero.tools)
+            )
+            latencies.append(await first_token_latency(agent, "hello"))
+            await client.close()
+        await zero.close()
+        return latencies
+    
+    async def pooled(server):
+        latencies = []
+        async with a0mini.AgentZeroMini(api_key="mock", base_url=server.base_url, log_writer=a0mini.LogWriter(echo=False)) as zero:
+            agent = zero.agent.clone(tools=function_tools(zero.tools))
+            for _ in range(turns):
+                latencies.append(await first_token_latency(agent, "hello"))
+        return latencies
+    
+    async def run():
+        agents.set_tracing_disabled(True)
+        for name, method in (("per-turn", per_turn), ("pooled", pooled)):
+            with replay.ReplayServer([replay.text(["Hello", " from", " the", " mock", " server."])], handshake=handshake) as server:
+                latencies = sorted(await method(server))
+                mean = sum(latencies) / len(latencies)
+                print(f"{name:>10} {mean * 1000:>10.1f} {latencies[len(latencies) // 2] * 1000:>10.1f} {server.connections:>12}")
+    
+    asyncio.run(run())
+
+
+def bench_directory_listing(packages=2000, files=20):
+    """Compare the os.walk listing with the pruned, cached scandir listing on a tree with a large ignored folder."""
+    print(f"Directory view of a project with {packages * files} files in node_modules")
+    print(f"{'listing':>10} {'time (ms)':>10} {'entries':>8}")
+    
+    def walk(path):
+        # The previous str_replace_editor listing
+        result = []
+        for root, _, names in os.walk(path):
+            rel = os.path.relpath(root, path)
+            depth = 0 if rel == "." else rel.count(os.sep) + 1
+            if depth < 2 and (rel == '.' or not rel.startswith(".")):
+                if rel != ".":
+                    result.append(os.path.join(".", rel, ""))
+                for name in names:
+                    result.append(os.path.join(".", name) if rel == "." else os.path.join(".", rel, name))
+        return sorted(result)
+    
+    with tempfile.TemporaryDirectory() as root:
+        for package in range(packages):
+            folder = os.path.join(root, "node_modules", f"package{package}", "lib")
+            os.makedirs(folder)
+            for number in range(files):
+                open(os.path.join(folder, f"file{number}.js"), "w").close()
+        os.makedirs(os.path.join(root, "src"))
+        for number in range(50):
+            open(os.path.join(root, "src", f"module{number}.py"), "w").close()
+        with open(os.path.join(root, ".gitignore"), "w") as f:
+            f.write("node_modules/\n")
+        cache = editor.DirectoryCache()
+        for name, method in (("os.walk", walk), ("scandir", lambda path: editor.list_directory(path, cache=cache)[0]), ("cached", lambda path: editor.list_directory(path, cache=cache)[0])):
+            start = time.perf_counter()
+            entries = method(root)
+            print(f"{name:>10} {(time.perf_counter() - start) * 1000:>10.2f} {len(entries):>8}")
+
+
+def bench_file_view(lines=2000000, view=(1000000, 1000040)):
+    """Compare reading and splitting the whole file with the line index for a 40 line view."""
+    print(f"View of lines {view[0]}-{view[1]} in a {lines} line file")
+    print(f"{'reader':>10} {'time (ms)':>10}")
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "big.log")
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(f"{number:>8} some log message with a few words\n" for number in range(lines))
+        start = time.perf_counter()
+        with open(path, encoding="utf-8") as f:
+            content = "\n".join(f.read().split("\n")[view[0] - 1 : view[1]])
+        print(f"{'split':>10} {(time.perf_counter() - start) * 1000:>10.2f}")
+        for name in ("index", "cached"):
+            start = time.perf_counter()
+            with editor.line_index(path) as index:
+                assert index.read(*view) == content
+            print(f"{name:>10} {(time.perf_counter() - start) * 1000:>10.2f}")
+        editor.line_indexes.pop(path).close()
+
+
+def bench_file_edit(lines=2000000):
+    """Compare the previous in-memory str_replace with the streaming engine, in time and peak Python memory."""
+    print(f"str_replace of one line in a {lines} line file")
+    print(f"{'editor':>10} {'time (ms)':>10} {'peak (MB)':>10}")
+    
+    def legacy(path, old, new):
+        with open(path, encoding="utf-8") as f:
+            content = f.read().expandtabs()
+        assert content.count(old) == 1
+        new_content = content.replace(old, new)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(new_content)
+        replacement = content.split(old)[0].count("\n")
+        return "\n".join(new_content.split("\n")[max(0, replacement - 4) : replacement + 5])
+    
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "big.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(f"value_{number} = {number}\n" for number in range(lines))
+        for name, method in (("legacy", legacy), ("engine", editor.replace)):
+            number = lines // 2
+            tracemalloc.start()
+            start = time.perf_counter()
+            method(path, f"value_{number} = {number}\n", f"value_{number} = {-number}\n")
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{name:>10} {elapsed * 1000:>10.2f} {peak / 1e6:>10.1f}")
+            editor.replace(path, f"value_{number} = {-number}\n", f"value_{number} = {number}\n")
+
+
+def bench_apply_patch(cases=((300, 5000, 10), (20, 100000, 500))):
+    """Compare the previous file-by-file apply_patch with the transactional engine, in throughput."""
+    print("apply_patch of anchored hunks")
+    print(f"{'files':>6} {'lines':>7} {'hunks':>6} {'engine':>8} {'time (ms)':>10} {'files/s':>10} {'hunks/s':>10}")
+    
+    def legacy(patch_text):
+        lines = patch_text.strip().split("\n")
+        i = 1
+        while i < len(lines) and not lines[i].startswith("*** End Patch"):
+            cmd, i = lines[i], i + 1
+            with open(cmd[17:], encoding="utf-8") as f:
+                file_lines = f.read().split("\n")
+            idx, result = 0, []
+            while i < len(lines) and not lines[i].startswith("***"):
+                patch_line, i = lines[i], i + 1
+                if patch_line.startswith("@@ "):
+                    found = next((j for j, line in enumerate(file_lines[idx:], idx) if line == patch_line[3:]), idx)
+                    result.extend(file_lines[idx:found])
+                    idx = found
+                elif patch_line[0] in " -":
+                    assert file_lines[idx] == patch_line[1:]
+                    result.append(file_lines[idx]) if patch_line[0] == " " else None
+                    idx += 1
+                elif patch_line[0] == "+":
+                    result.append(patch_line[1:])
+            result.extend(file_lines[idx:])
+            with open(cmd[17:], "w", encoding="utf-8") as f:
+                f.write("\n".join(result))
+    
+    for files, lines, hunks in cases:
+        patch = ["*** Begin Patch"]
+        for number in range(files):
+            patch.append(f"*** Update File: module_{number}.py")
+            for line in range(lines // (2 * hunks), lines, lines // hunks):
+                patch += [f"@@ value_{line} = {line}", f" value_{line} = {line}", f"-value_{line + 1} = {line + 1}", f"+value_{line + 1} = {-line - 1}"]
+        patch = "\n".join(patch + ["*** End Patch"])
+        cwd = os.getcwd()
+        for name, method in (("legacy", legacy), ("engine", editor.apply_patch)):
+            with tempfile.TemporaryDirectory() as root:
+                os.chdir(root)
+                try:
+                    for number in range(files):
+                        with open(f"module_{number}.py", "w", encoding="utf-8") as f:
+                            f.writelines(f"value_{line} = {line}\n" for line in range(lines))
+                    start = time.perf_counter()
+                    method(patch)
+                    elapsed = time.perf_counter() - start
+                finally:
+                    os.chdir(cwd)
+            print(f"{files:>6} {lines:>7} {hunks:>6} {name:>8} {elapsed * 1000:>10.2f} {files / elapsed:>10.0f} {files * hunks / elapsed:>10.0f}")
+
+
+def bench_screenshot(size=(3840, 2160), runs=10):
+    """Compare full-resolution PNG screenshots with the downscaled, encoded and reused frames of cua.py."""
+    try:
+        from PIL import Image, ImageDraw
+        import screen
+    except ImportError as e:
+        print(f"Screenshot benchmark skipped (missing dependency: {e})")
+        return
+    import base64
+    import io
+    print(f"Screenshot of a {size[0]}x{size[1]} frame over {runs} runs")
+    print(f"{'pipeline':>12} {'mean (ms)':>10} {'size (KB)':>10}")
+    generator = random.Random(0)
+    frame = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(frame)
+    for _ in range(200):
+        x, y = generator.randrange(size[0]), generator.randrange(size[1])
+        draw.rectangle((x, y, x + generator.randrange(400), y + generator.randrange(300)), fill=tuple(generator.randrange(256) for _ in range(3)))
+        draw.text((x, y), "lorem ipsum " * 4, fill="black")
+    
+    def legacy():
+        buffer = io.BytesIO()
+        frame.save(buffer, format="PNG")
+        return base64.b64encode(buffer.getvalue()).decode("utf-8")
+    
+    pipelines = [("legacy", legacy)]
+    for format in ("png", "jpeg", "webp"):
+        pipelines.append((format, screen.Screen(size, capture=frame.copy, format=format, reuse=False).screenshot))
+    pipelines.append(("png reused", screen.Screen(size, capture=frame.copy).screenshot))
+    for name, method in pipelines:
+        start = time.perf_counter()
+        for _ in range(runs):
+            data = method()
+        elapsed = time.perf_counter() - start
+        print(f"{name:>12} {elapsed / runs * 1000:>10.2f} {len(data) * 3 / 4 / 1024:>10.1f}")
+
+
+def bench_computer_use(sessions=(1, 4, 16), steps=40):
+    """Measure computer-use steps per second on virtual displays with a scripted model, with sessions side by side."""
+    try:
+        import display
+    except ImportError as e:
+        print(f"Computer-use benchmark skipped (missing dependency: {e})")
+        return
+    print(f"Computer-use sessions of {steps} scripted steps on virtual displays")
+    print(f"{'sessions':>8} {'time (s)':>9} {'steps/s':>9}")
+    agents.set_tracing_disabled(True)
+    
+    async def session():
+        agent = agents.Agent(name="computer-use", model=display.ScriptedModel(steps), tools=[agents.ComputerTool(display.VirtualComputer())])
+        await agents.Runner.run(agent, "go", max_turns=steps + 1)
+    
+    async def run(count):
+        await asyncio.gather(*(session() for _ in range(count)))
+    
+    for count in sessions:
+        start = time.perf_counter()
+        asyncio.run(run(count))
+        elapsed = time.perf_counter() - start
+        print(f"{count:>8} {elapsed:>9.2f} {count * steps / elapsed:>9.1f}")
+
+
+def bench_python_execution(runs=50, preload=("json",)):
+    """Compare a fresh interpreter per snippet with the warm worker pool."""
+    print(f"Python snippet execution over {runs} runs")
+    print(f"{'executor':>10} {'mean (ms)':>10}")
+    code = "import json; print(json.dumps({'answer': 42}))"
+    start = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    print(f"{'process':>10} {(time.perf_counter() - start) / runs * 1000:>10.2f}")
+    pool = a0mini.PythonWorkerPool(size=1, preload=preload, max_runs=runs + 1)
+    pool.run("pass")
+    start = time.perf_counter()
+    for _ in range(runs):
+        pool.run(code)
+    print(f"{'pool':>10} {(time.perf_counter() - start) / runs * 1000:>10.2f}")
+    pool.close()
+
+
+def main():
+    bench_memory_search()
+    print()
+    bench_vector_search()
+    print()
+    bench_recent_solutions()
+    print()
+    bench_first_token()
+    print()
+    bench_directory_listing()
+    print()
+    bench_file_view()
+    print()
+    bench_file_edit()
+    print()
+    bench_apply_patch()
+    print()
+    bench_screenshot()
+    print()
+    bench_computer_use()
+    print()
+    bench_python_execution()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,36 @@
 import asyncio
 import os
-import subprocess
 import sys
 
 import agents
 import openai
 
+import editor
+import history
+import metrics
+import replay
+import terminal
+import toolcache
 
-def read_file(path: str):
-    with open(path, encoding="utf-8") as f:
-        return f.read()
 
 def write_file(path: str, file: str):
     with open(path, "w", encoding="utf-8") as f:
         return f.write(file)
 
+tool_cache = toolcache.from_env()
+# Tools block on files and processes, so they run on threads and overlap up to this limit,
+# except `bash` commands, which share one shell session and run one at a time
+tool_slots = asyncio.Semaphore(terminal.PARALLEL_TOOLS)
+
+VIEW_LIMIT = 16000
+
 @agents.tool.function_tool
+@terminal.offload(tool_slots)
 def str_replace_editor(command: str, path: str, file_text: str | None = None, view_range: list[int] | None = None, old_str: str | None = None, new_str: str | None = None, insert_line: int | None = None):
     """
     Custom editing tool for viewing, creating and editing files
     * State is persistent across command calls and discussions with the user
-    * If `path` is a file, `view` displays the result of applying `cat -n`. If `path` is a directory, `view` lists non-hidden files and directories up to 2 levels deep
+    * If `path` is a file, `view` displays the result of applying `cat -n`. If `path` is a directory, `view` lists non-hidden files and directories up to 2 levels deep, skipping those ignored by `.gitignore`
     * The `create` command cannot be used if the specified `path` already exists as a file
     * If a `command` generates a long output, it will be truncated and marked with `<response clipped>`
 
@@ -39,7 +49,7 @@ def str_replace_editor(command: str, path: str, file_text: str | None = None, vi
     view_range (list of int): Optional parameter of `view` command when `path` points to a file. If none is given, the full file is shown. If provided, the file will be shown in the indicated line number range, e.g. [11, 12] will show lines 11 and 12. Indexing at 1 to start. Setting `[start_line, -1]` shows all lines from `start_line` to the end of the file.
     """
     def make_output(content: str, file: str, init_line: int = 1, expand_tabs: bool = True):
-        content = content if len(content) <= 16000 else content[:16000] + "<response clipped><NOTE>To save on context only part of this file has been shown to you. You should retry this tool after you have searched inside the file with `grep -n` in order to find the line numbers of what you are looking for.</NOTE>"
+        content = content if len(content) <= VIEW_LIMIT else content[:VIEW_LIMIT] + "<response clipped><NOTE>To save on context only part of this file has been shown to you. You should retry this tool after you have searched inside the file with `grep -n` in order to find the line numbers of what you are looking for.</NOTE>"
         content = content.expandtabs() if expand_tabs else content
         content = "\n".join([f"{i + init_line:6}\t{line}" for i, line in enumerate(content.split("\n"))])
         return f"Here's the result of running `cat -n` on {file}:\n" + content + "\n"
@@ -57,76 +67,61 @@ def str_replace_editor(command: str, path: str, file_text: str | None = None, vi
         raise IsADirectoryError(f"The path '{path}' is a directory and only the `view` command can be used on directories")
     if command == "view":
         print(f"\n\U0001F50D\033[32m > {command} {os.path.relpath(path, location)}{':'+(':'.join(str(_) for _ in view_range)) if view_range else ''}\033[0m")
+        key = ("view", path, tuple(view_range) if view_range else None)
+        cached = tool_cache.get(key)
+        if cached is not None:
+            return cached
         if os.path.isdir(path):
             if view_range:
                 raise ValueError("The `view_range` parameter is not allowed when `path` points to a directory.")
-            result = []
-            for root, _, files in os.walk(path):
-                rel = os.path.relpath(root, path)
-                depth = 0 if rel == "." else rel.count(os.sep) + 1
-                if depth < 2 and (rel == '.' or not rel.startswith(".")):
-                    if rel != ".":
-                        result.append(os.path.join(".", rel, ""))
-                    for file in files:
-                        result.append(os.path.join(".", file) if rel == "." else os.path.join(".", rel, file))
-            return sorted(result)
-        content = read_file(path)
-        first = 1
-        if view_range:
-            if len(view_range) != 2 or not all(isinstance(i, int) for i in view_range):
-                raise ValueError("Invalid `view_range`. It should be a list of two integers.")
-            lines = content.split("\n")
-            line_count = len(lines)
-            first, last = view_range
-            if first < 1 or first > line_count:
-                raise ValueError(f"Invalid `view_range`: {view_range}. Its first element `{first}` should be within the range of lines of the file: {[1, line_count]}")
-            if last > line_count:
-                raise ValueError(f"Invalid `view_range`: {view_range}. Its second element `{last}` should be smaller than the number of lines in the file: `{line_count}`")
-            if last != -1 and last < first:
-                raise ValueError(f"Invalid `view_range`: {view_range}. Its second element `{last}` should be larger or equal than its first `{first}`")
-            content = "\n".join(lines[first - 1 :]) if last == -1 else "\n".join(lines[first - 1 : last])
-        return make_output(content, str(path), init_line=first)
+            result, sources = editor.list_directory(path)
+            return tool_cache.put(key, result, sources)
+        first, last = 1, -1
+        with editor.line_index(path) as index:
+            if view_range:
+                if len(view_range) != 2 or not all(isinstance(i, int) for i in view_range):
+                    raise ValueError("Invalid `view_range`. It should be a list of two integers.")
+                first, last = view_range
+                if first < 1 or not index.has_line(first):
+                    raise ValueError(f"Invalid `view_range`: {view_range}. Its first element `{first}` should be within the range of lines of the file: {[1, index.line_count()]}")
+                if not index.has_line(last):
+                    raise ValueError(f"Invalid `view_range`: {view_range}. Its second element `{last}` should be smaller than the number of lines in the file: `{index.line_count()}`")
+                if last != -1 and last < first:
+                    raise ValueError(f"Invalid `view_range`: {view_range}. Its second element `{last}` should be larger or equal than its first `{first}`")
+            # Read only as much of the range as make_output can show, at most 4 bytes per character
+            content = index.read(first, None if last == -1 else last, limit=4 * VIEW_LIMIT + 4)
+        return tool_cache.put(key, make_output(content, str(path), init_line=first), [path])
     print(f"\n\u270F\uFE0F\033[32m  > {command} {os.path.relpath(path, location)}\033[0m")
     if command == "create":
         if file_text is None:
             raise ValueError("Parameter `file_text` required for command 'create'.")
-        write_file(path, file_text)
+        # Checked again under the lock so two concurrent creates cannot both write
+        with editor.locked(os.path.realpath(path)):
+            if os.path.exists(path):
+                raise FileExistsError(f"File already exists at '{path}' and cannot be overwritten using `create`")
+            write_file(path, file_text)
+        tool_cache.invalidate(path)
         return f"File created successfully: '{path}'."
     if command == "str_replace":
         if old_str is None:
             raise ValueError("Parameter `old_str` required for command 'str_replace'.")
-        content = read_file(path).expandtabs()
-        old_str = old_str.expandtabs()
-        new_str = new_str.expandtabs() if new_str else ""
-        occurrences = content.count(old_str)
-        if occurrences == 0:
-            raise ValueError(f"No replacement was performed, old_str `{old_str}` did not appear verbatim in {path}")
-        if occurrences > 1:
-            raise ValueError(f"No replacement was performed. Multiple occurrences of old_str `{old_str}` in lines {[i + 1 for i, line in enumerate(content.splitlines()) if old_str in line]}. Please ensure it is unique.")
-        new_content = content.replace(old_str, new_str)
-        write_file(path, new_content)
-        replacement = content.split(old_str)[0].count("\n")
-        start = max(0, replacement - 4)
-        end = replacement + 4 + new_str.count("\n")
-        snippet = "\n".join(new_content.split("\n")[start : end + 1])
-        output = make_output(snippet, f"a snippet of {path}", start + 1)
+        first, snippet = editor.replace(path, old_str, new_str or "")
+        tool_cache.invalidate(path)
+        output = make_output(snippet, f"a snippet of {path}", first)
         return f"The file {path} has been edited. {output}Review the changes and make sure they are as expected. Edit the file again if necessary."
     if command == "insert":
         if insert_line is None or new_str is None:
             raise ValueError("Parameters `insert_line` and `new_str` are required for command 'insert'.")
-        content = read_file(path).expandtabs()
-        new_str = new_str.expandtabs()
-        lines = content.split("\n")
-        if insert_line < 0 or insert_line > len(lines):
-            raise ValueError(f"Invalid `insert_line` parameter: {insert_line}. It should be within the range of lines of the file: {[0, len(lines)]}")
-        new_lines = new_str.split("\n")
-        snippet = "\n".join(lines[max(0, insert_line - 4) : insert_line] + new_lines + lines[insert_line : insert_line + 4])
-        write_file(path, "\n".join(lines[:insert_line] + new_lines + lines[insert_line:]))
-        output = make_output(snippet, "a snippet of the edited file", max(1, insert_line - 4 + 1))
+        first, snippet = editor.insert(path, insert_line, new_str)
+        tool_cache.invalidate(path)
+        output = make_output(snippet, "a snippet of the edited file", first)
         return f"The file {path} has been edited. {output}Review the changes and make sure they are as expected (correct indentation, no duplicate lines, etc). Edit the file again if necessary."
     raise ValueError(f'Unrecognized command {command}.')
 
+session = terminal.ShellSession(timeout=300, echo=True)
+
 @agents.tool.function_tool
+@terminal.offload(tool_slots)
 def bash(command: str) -> str:
     """
     Run commands in a bash shell
@@ -142,59 +137,46 @@ def bash(command: str) -> str:
     command (str): The bash command to run.
     """
     print(f"\n\U0001F5A5\033[32m  > {command}\033[0m")
-    return subprocess.run(command, shell=True, capture_output=True, text=True, check=True).stdout
+    readonly = toolcache.read_only(command)
+    if readonly and (cached := tool_cache.get(("bash", command))) is not None:
+        return cached
+    if not readonly:
+        tool_cache.invalidate_commands()
+    if terminal.ShellSession.available():
+        result, directory = session.run(command), session.directory()
+    else:
+        result, directory = terminal.run(command, shell=True, echo=True), os.getcwd()
+    result.check_returncode()
+    # Output is cached only when the files it was read from can be checked for changes
+    if readonly and (sources := toolcache.sources(command, directory)) is not None:
+        return tool_cache.put(("bash", command), result.stdout, sources, command=True)
+    return result.stdout
 
 @agents.tool.function_tool
+@terminal.offload(tool_slots)
 def apply_patch(patch_text: str) -> str:
     print("\n\U0001F4DD\033[32m  > apply_patch\033[0m")
-    def write_lines(path: str, content: list) -> None:
-        if "/" in path:
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-        write_file(path, "\n".join(content))
-    lines = patch_text.strip().split("\n")
-    if not lines or not lines[0].startswith("*** Begin Patch"):
+    if not patch_text.strip().startswith("*** Begin Patch"):
         return "Error: Patch must start with '*** Begin Patch'"
-    i = 1
-    while i < len(lines) and not lines[i].startswith("*** End Patch"):
-        cmd, i = lines[i], i + 1
-        if cmd.startswith("*** Add File: "):
-            path, content = cmd[14:], []
-            while i < len(lines) and not lines[i].startswith("***"):
-                content.append(lines[i][1:] if lines[i].startswith("+") else lines[i])
-                i += 1
-            if os.path.exists(path):
-                raise FileExistsError(f"Cannot add file '{path}': file already exists")
-            write_lines(path, content)
-        elif cmd.startswith("*** Delete File: "):
-            os.remove(cmd[17:])
-        elif cmd.startswith("*** Update File: "):
-            file_lines = read_file(cmd[17:]).split("\n")
-            idx, result = 0, []
-            while i < len(lines) and not lines[i].startswith("***"):
-                patch_line, i = lines[i], i + 1
-                if not patch_line:
-                    continue
-                if patch_line.startswith("@@ "):
-                    found = next((j for j, line in enumerate(file_lines[idx:], idx) if line == patch_line[3:]), idx)
-                    result.extend(file_lines[idx:found])
-                    idx = found
-                elif patch_line[0] in " -":
-                    content = patch_line[1:]
-                    if idx >= len(file_lines) or file_lines[idx] != content:
-                        raise ValueError(f"{'Context' if patch_line[0] == ' ' else 'Deletion'} mismatch at {idx}: expected {repr(content)}, found {repr(file_lines[idx] if idx < len(file_lines) else 'EOF')}")
-                    result.append(file_lines[idx]) if patch_line[0] == " " else None
-                    idx += 1
-                elif patch_line[0] == "+":
-                    result.append(patch_line[1:])
-            result.extend(file_lines[idx:])
-            write_lines(cmd[17:], result)
+    for path in editor.apply_patch(patch_text):
+        tool_cache.invalidate(path)
     return "Patch applied successfully"
 
 @agents.tool.function_tool
+@terminal.offload(tool_slots)
 def shell(command: list[str], workdir: str) -> str:
     print(f"\n\U0001F5A5\033[32m  > shell {' '.join(command)} (in {workdir})\033[0m")
-    result = subprocess.run(command, cwd=workdir, capture_output=True, text=True, check=False)
-    return result.stdout if result.returncode == 0 else f"Exit code {result.returncode}\n{result.stderr}"
+    readonly, key = toolcache.read_only(command), ("shell", workdir, tuple(command))
+    if readonly and (cached := tool_cache.get(key)) is not None:
+        return cached
+    if not readonly:
+        tool_cache.invalidate_commands()
+    result = terminal.run(command, cwd=workdir, echo=True)
+    if result.returncode != 0:
+        return f"Exit code {result.returncode}\n{result.stderr}"
+    if readonly and (sources := toolcache.sources(command, os.path.abspath(workdir))) is not None:
+        return tool_cache.put(key, result.stdout, sources, command=True)
+    return result.stdout
 
 async def main():
     argv = list(sys.argv[1:])
@@ -212,11 +194,11 @@ async def main():
         tools = [apply_patch, shell, agents.WebSearchTool()]
     elif model == 'claude':
         tools = [str_replace_editor, bash]
-        client = openai.AsyncOpenAI(api_key=os.getenv("ANTHROPIC_API_KEY"), base_url="https://api.anthropic.com/v1/")
+        client = replay.connect(openai.AsyncOpenAI(api_key=os.getenv("ANTHROPIC_API_KEY"), base_url="https://api.anthropic.com/v1/"))
         model = agents.OpenAIChatCompletionsModel("claude-opus-4-5", client)
     elif model == 'gemini':
         tools = [str_replace_editor, bash]
-        client = openai.AsyncOpenAI(api_key=os.getenv('GEMINI_API_KEY'), base_url='https://generativelanguage.googleapis.com/v1beta/')
+        client = replay.connect(openai.AsyncOpenAI(api_key=os.getenv('GEMINI_API_KEY'), base_url='https://generativelanguage.googleapis.com/v1beta/'))
         model = agents.OpenAIChatCompletionsModel("gemini-2.5-pro", client)
     instructions = f"""
 The code repository is in this directory: <location>{location}</location>
@@ -230,18 +212,19 @@ Follow these steps:
 Your thinking should be thorough and so it's fine if it's very long.
 """
     agent = agents.Agent("code", instructions=instructions, model=model, model_settings=model_settings, tools=tools)
-    messages = []
+    recorder = metrics.Recorder(os.getenv("AGENT_METRICS"))
+    messages = history.History(int(os.getenv("CODE_HISTORY_BUDGET", "24000")))
     while True:
         user_request = input("\U0001F464 User: ") if not prompt else prompt
         print("\U0001F916 ", end="", flush=True)
-        messages.append({"role": "user", "content": user_request})
-        stream = agents.Runner.run_streamed(agent, messages, max_turns=100)
+        messages.append("user", user_request)
+        stream = agents.Runner.run_streamed(agent, messages.messages(), max_turns=100, hooks=recorder)
         response = ""
-        async for event in stream.stream_events():
+        async for event in recorder.stream(stream):
             if event.type == 'raw_response_event' and event.data.type == "response.output_text.delta":
                 response += event.data.delta
                 print(event.data.delta, end="", flush=True)
-        messages.append({"role": "assistant", "content": response})
+        messages.append("assistant", response)
         print("")
         if prompt:
             break
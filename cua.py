@@ -1,17 +1,45 @@
 import asyncio
-import base64
-import io
+import concurrent.futures
+import functools
+import os
 import platform
+import sys
 
 import agents
-import pyautogui
+
+import metrics
+import screen
+
+try:
+    import pyautogui
+except Exception:
+    # No desktop to drive, e.g. in CI, only `--virtual` works
+    pyautogui = None
+
+
+# Seconds the cursor takes to move, and to move while dragging, 0 jumps
+MOVE_DURATION = float(os.getenv("CUA_MOVE_DURATION", "0"))
+DRAG_DURATION = float(os.getenv("CUA_DRAG_DURATION", "0.2"))
+# pyautogui sleeps this long after every call, 0.1 seconds by default
+if pyautogui is not None:
+    pyautogui.PAUSE = float(os.getenv("CUA_ACTION_PAUSE", "0.02"))
 
 
 class LocalComputer(agents.AsyncComputer):
+    """
+    Drives the local screen, mouse and keyboard with pyautogui.
+
+    Actions run in order on one dedicated thread so the event loop keeps
+    streaming. Typing and key presses are queued and sent with the next
+    other action or screenshot, so a run of them costs one thread hop.
+    """
 
     def __init__(self):
-        screenshot = pyautogui.screenshot()
-        self.size = screenshot.size
+        # Mouse actions use the logical screen size, the model sees downscaled frames
+        self.size = tuple(pyautogui.size())
+        self.screen = screen.Screen(self.size)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="cua")
+        self.pending = []
 
     @property
     def environment(self) -> agents.Environment:
@@ -20,36 +48,51 @@ class LocalComputer(agents.AsyncComputer):
 
     @property
     def dimensions(self) -> tuple[int, int]:
-        return self.size
+        return self.screen.dimensions
+
+    async def run(self, function=None, *args, **kwargs):
+        """Run the queued keyboard actions, then `function`, on the action thread and return its result."""
+        actions, self.pending = self.pending, []
+        if function is not None:
+            actions.append(functools.partial(function, *args, **kwargs))
+        if not actions:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(self.executor, lambda: [action() for action in actions][-1])
+
+    def inside(self, x: int, y: int) -> bool:
+        return 0 <= x < self.size[0] and 0 <= y < self.size[1]
 
     async def screenshot(self) -> str:
-        buffer = io.BytesIO()
-        pyautogui.screenshot().save(buffer, format="PNG")
-        return base64.b64encode(buffer.getvalue()).decode("utf-8")
+        return await self.run(self.screen.screenshot)
 
     async def click(self, x: int, y: int, button: str = "left") -> None:
-        if 0 <= x < self.size[0] and 0 <= y < self.size[1]:
+        x, y = self.screen.point(x, y)
+        if self.inside(x, y):
             button = "middle" if button == "wheel" else button
-            pyautogui.moveTo(x, y, duration=0.1)
-            pyautogui.click(x, y, button=button)
+            await self.run(pyautogui.click, x, y, button=button, duration=MOVE_DURATION)
 
     async def double_click(self, x: int, y: int) -> None:
-        if 0 <= x < self.size[0] and 0 <= y < self.size[1]:
-            pyautogui.moveTo(x, y, duration=0.1)
-            pyautogui.doubleClick(x, y)
+        x, y = self.screen.point(x, y)
+        if self.inside(x, y):
+            await self.run(pyautogui.doubleClick, x, y, duration=MOVE_DURATION)
 
     async def scroll(self, x: int, y: int, scroll_x: int, scroll_y: int) -> None:
-        pyautogui.scroll(-scroll_y, x=x, y=y)
-        pyautogui.hscroll(scroll_x, x=x, y=y)
+        x, y = self.screen.point(x, y)
+        def scroll():
+            pyautogui.scroll(-scroll_y, x=x, y=y)
+            pyautogui.hscroll(scroll_x, x=x, y=y)
+        await self.run(scroll)
 
     async def type(self, text: str) -> None:
-        pyautogui.write(text)
+        self.pending.append(functools.partial(pyautogui.write, text))
 
     async def wait(self, ms: int = 1000) -> None:
+        await self.run()
         await asyncio.sleep(ms / 1000)
 
     async def move(self, x: int, y: int) -> None:
-        pyautogui.moveTo(x, y, duration=0.1)
+        x, y = self.screen.point(x, y)
+        await self.run(pyautogui.moveTo, x, y, duration=MOVE_DURATION)
 
     async def keypress(self, keys: list[str]) -> None:
         keymap = {
@@ -57,30 +100,37 @@ class LocalComputer(agents.AsyncComputer):
             "arrowright": "right", "arrowup": "up",
         }
         keys = [keymap.get(key.lower(), key.lower()) for key in keys]
-        for key in keys:
-            pyautogui.keyDown(key)
-        for key in keys:
-            pyautogui.keyUp(key)
+        # A chord is held for a single pause, not one per key
+        self.pending.append(functools.partial(pyautogui.hotkey, *keys))
 
     async def drag(self, path: list[tuple[int, int]]) -> None:
+        path = [self.screen.point(x, y) for x, y in path]
         if len(path) >= 2:
-            pyautogui.moveTo(path[0][0], path[0][1], duration=0.5)
-            for point in path[1:]:
-                pyautogui.dragTo(point[0], point[1], duration=1.0, button="left")
+            def drag():
+                pyautogui.moveTo(path[0][0], path[0][1], duration=MOVE_DURATION)
+                for point in path[1:]:
+                    pyautogui.dragTo(point[0], point[1], duration=DRAG_DURATION, button="left")
+            await self.run(drag)
 
 async def main():
+    if "--virtual" in sys.argv[1:]:
+        import display
+        computer = display.VirtualComputer()
+    else:
+        computer = LocalComputer()
     agent = agents.Agent(
         "computer-use",
         "You are a helpful agent. DO NOT ask the user for confirmations.",
         model="computer-use-preview",
         model_settings=agents.ModelSettings(truncation="auto",
             reasoning={"generate_summary": "concise"}),
-        tools=[agents.ComputerTool(LocalComputer())],
+        tools=[agents.ComputerTool(computer)],
     )
+    recorder = metrics.Recorder(os.getenv("AGENT_METRICS"))
     while True:
         prompt = input("\U0001F464 User: ")
-        stream = agents.Runner.run_streamed(agent, prompt, max_turns=100)
-        async for event in stream.stream_events():
+        stream = agents.Runner.run_streamed(agent, prompt, max_turns=100, hooks=recorder)
+        async for event in recorder.stream(stream):
             if event.type == 'run_item_stream_event':
                 if event.name == 'tool_called':
                     action_args = vars(event.item.raw_item.action) | {}
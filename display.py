@@ -0,0 +1,147 @@
+import asyncio
+
+import agents
+from openai.types.responses import Response, ResponseCompletedEvent, ResponseComputerToolCall, ResponseOutputMessage, ResponseOutputText
+from PIL import Image, ImageDraw
+
+import screen
+
+# Actions `ScriptedModel` cycles through, in the coordinates of a 1280x720 screen
+SCRIPT = [
+    {"type": "click", "x": 640, "y": 360, "button": "left"},
+    {"type": "type", "text": "hello world"},
+    {"type": "keypress", "keys": ["enter"]},
+    {"type": "scroll", "x": 640, "y": 360, "scroll_x": 0, "scroll_y": 1},
+    {"type": "drag", "path": [{"x": 100, "y": 100}, {"x": 300, "y": 200}]},
+    {"type": "move", "x": 900, "y": 500},
+    {"type": "double_click", "x": 200, "y": 600},
+    {"type": "keypress", "keys": ["backspace"]}
+]
+
+
+class VirtualComputer(agents.AsyncComputer):
+    """
+    A computer with an in-memory framebuffer instead of a desktop.
+
+    Clicks and drags are drawn onto the frame, typing and key presses edit a
+    text area, and screenshots go through the same `screen.Screen` pipeline
+    as the real desktop, on a worker thread. Instances share no state, so
+    several sessions can run side by side in one process and without a
+    display, e.g. in tests and benchmarks. Every action is kept in `actions`.
+    """
+
+    def __init__(self, size: tuple = (1280, 720), width: int = screen.SCREENSHOT_WIDTH, format: str = screen.SCREENSHOT_FORMAT):
+        self.size = tuple(size)
+        self.canvas = Image.new("RGB", self.size, "white")
+        self.lines = [""]
+        self.offset = 0
+        self.cursor = (0, 0)
+        self.actions = []
+        self.screen = screen.Screen(self.size, capture=self.render, width=width, format=format)
+
+    @property
+    def environment(self) -> agents.Environment:
+        return "ubuntu"
+
+    @property
+    def dimensions(self) -> tuple[int, int]:
+        return self.screen.dimensions
+
+    def render(self) -> Image.Image:
+        frame = self.canvas.copy()
+        draw = ImageDraw.Draw(frame)
+        for number, line in enumerate(self.lines[self.offset:]):
+            draw.text((10, 10 + 16 * number), line, fill="black")
+        x, y = self.cursor
+        draw.polygon([(x, y), (x, y + 16), (x + 11, y + 11)], fill="black")
+        return frame
+
+    def point(self, x: int, y: int) -> tuple:
+        x, y = self.screen.point(x, y)
+        return min(max(x, 0), self.size[0] - 1), min(max(y, 0), self.size[1] - 1)
+
+    async def screenshot(self) -> str:
+        self.actions.append(("screenshot",))
+        return await asyncio.to_thread(self.screen.screenshot)
+
+    async def click(self, x: int, y: int, button: str = "left") -> None:
+        self.cursor = self.point(x, y)
+        self.actions.append(("click", *self.cursor, button))
+        x, y = self.cursor
+        ImageDraw.Draw(self.canvas).ellipse((x - 4, y - 4, x + 4, y + 4), outline="red")
+
+    async def double_click(self, x: int, y: int) -> None:
+        self.cursor = self.point(x, y)
+        self.actions.append(("double_click", *self.cursor))
+        x, y = self.cursor
+        ImageDraw.Draw(self.canvas).ellipse((x - 6, y - 6, x + 6, y + 6), outline="red")
+
+    async def scroll(self, x: int, y: int, scroll_x: int, scroll_y: int) -> None:
+        self.cursor = self.point(x, y)
+        self.actions.append(("scroll", *self.cursor, scroll_x, scroll_y))
+        self.offset = min(max(self.offset + scroll_y, 0), len(self.lines) - 1)
+
+    async def type(self, text: str) -> None:
+        self.actions.append(("type", text))
+        first, *rest = text.split("\n")
+        self.lines[-1] += first
+        self.lines.extend(rest)
+
+    async def wait(self, ms: int = 1000) -> None:
+        self.actions.append(("wait", ms))
+        await asyncio.sleep(ms / 1000)
+
+    async def move(self, x: int, y: int) -> None:
+        self.cursor = self.point(x, y)
+        self.actions.append(("move", *self.cursor))
+
+    async def keypress(self, keys: list[str]) -> None:
+        keys = [key.lower() for key in keys]
+        self.actions.append(("keypress", *keys))
+        if keys == ["enter"]:
+            self.lines.append("")
+        elif keys == ["backspace"]:
+            if self.lines[-1]:
+                self.lines[-1] = self.lines[-1][:-1]
+            elif len(self.lines) > 1:
+                self.lines.pop()
+        elif keys == ["space"]:
+            self.lines[-1] += " "
+
+    async def drag(self, path: list[tuple[int, int]]) -> None:
+        path = [self.point(x, y) for x, y in path]
+        self.actions.append(("drag", *path))
+        if len(path) >= 2:
+            ImageDraw.Draw(self.canvas).line(path, fill="blue", width=3)
+            self.cursor = path[-1]
+
+
+class ScriptedModel(agents.Model):
+    """
+    Model that makes `steps` computer calls from `script`, then answers,
+    without any API calls. With `latency` each response takes that many
+    seconds, to stand in for model time.
+    """
+
+    def __init__(self, steps: int, script: list = SCRIPT, latency: float = 0.0):
+        self.steps = steps
+        self.script = script
+        self.latency = latency
+        self.calls = 0
+
+    def output(self) -> list:
+        self.calls += 1
+        if self.calls > self.steps:
+            text = ResponseOutputText(type="output_text", text="Done.", annotations=[])
+            return [ResponseOutputMessage(id=f"msg_{self.calls}", type="message", role="assistant", status="completed", content=[text])]
+        action = self.script[(self.calls - 1) % len(self.script)]
+        return [ResponseComputerToolCall(id=f"cu_{self.calls}", call_id=f"call_{self.calls}", type="computer_call", status="completed", pending_safety_checks=[], action=action)]
+
+    async def get_response(self, *args, **kwargs) -> agents.ModelResponse:
+        await asyncio.sleep(self.latency)
+        return agents.ModelResponse(output=self.output(), usage=agents.Usage(), response_id=None)
+
+    async def stream_response(self, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        response = Response(id=f"response_{self.calls}", created_at=0, model="scripted", object="response", output=self.output(), parallel_tool_calls=False, tool_choice="auto", tools=[])
+        yield ResponseCompletedEvent(type="response.completed", response=response, sequence_number=0)
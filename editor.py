@@ -0,0 +1,675 @@
+import contextlib
+import fnmatch
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from array import array
+from collections import OrderedDict, deque
+
+import toolcache
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LISTING_LIMIT = int(os.getenv("AGENT_LISTING_LIMIT", "1000"))
+
+
+class DirectoryCache:
+    """
+    LRU cache of directory entries and `.gitignore` rules.
+
+    Entries are reused while the directory, or the `.gitignore` file, keeps
+    the same inode, size and modification time, so listing a large tree again
+    only scans the directories that changed. Listings on several threads can
+    share the cache.
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path: str, load):
+        stamp = toolcache.signature(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self.entries.move_to_end(path)
+                return entry[1]
+        # Load outside the lock, a slow folder should not hold up the others
+        value = load(path) if stamp is not None else []
+        with self.lock:
+            self.entries[path] = (stamp, value)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return value
+
+    def scan(self, folder: str) -> list:
+        """Return the sorted `(name, is_dir, is_link)` entries of a folder."""
+        def load(folder):
+            try:
+                with os.scandir(folder) as entries:
+                    return sorted((entry.name, entry.is_dir(), entry.is_symlink()) for entry in entries)
+            except OSError:
+                return []
+        return self.get(folder, load)
+
+    def rules(self, folder: str, base: str) -> list:
+        """Return the rules of the `.gitignore` in `folder`, relative to `base`."""
+        def load(path):
+            rules = []
+            with open(path, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    line = line.rstrip("\n").rstrip()
+                    if not line or line.startswith("#"):
+                        continue
+                    negate = line.startswith("!")
+                    line = line[1:] if negate else line
+                    directory = line.endswith("/")
+                    line = line.rstrip("/")
+                    # A leading or middle slash anchors the pattern to the folder
+                    anchored = "/" in line
+                    rules.append((line.lstrip("/"), negate, directory, anchored))
+            return rules
+        return [(base, *rule) for rule in self.get(os.path.join(folder, ".gitignore"), load)]
+
+
+directories = DirectoryCache()
+
+
+def ignored(rules: list, path: str, name: str, is_dir: bool) -> bool:
+    """Apply `.gitignore` rules to a path relative to the listed root, the last matching rule wins."""
+    result = False
+    for base, pattern, negate, directory, anchored in rules:
+        if directory and not is_dir:
+            continue
+        if anchored:
+            if base != "." and not path.startswith(base + "/"):
+                continue
+            matched = fnmatch.fnmatchcase(path if base == "." else path[len(base) + 1:], pattern)
+        else:
+            matched = fnmatch.fnmatchcase(name, pattern)
+        if matched:
+            result = not negate
+    return result
+
+
+def iter_directory(root: str, depth: int = 2, cache: DirectoryCache = directories, sources: list = None):
+    """
+    Yield the entries of `root` up to `depth` levels deep, breadth first, as
+    `./relative/path` with a trailing slash for folders.
+
+    Hidden folders and entries ignored by `.gitignore` files are skipped
+    without being scanned, and folders at the depth limit are listed but not
+    opened. The folders and `.gitignore` files read are added to `sources`.
+    """
+    queue = deque([(root, ".", 1, [])])
+    while queue:
+        folder, relative, level, rules = queue.popleft()
+        if sources is not None:
+            sources += [folder, os.path.join(folder, ".gitignore")]
+        rules = rules + cache.rules(folder, relative)
+        for name, is_dir, is_link in cache.scan(folder):
+            path = name if relative == "." else f"{relative}/{name}"
+            if (is_dir and name.startswith(".")) or ignored(rules, path, name, is_dir):
+                continue
+            yield os.path.join(".", path, "") if is_dir else os.path.join(".", path)
+            if is_dir and not is_link and level < depth:
+                queue.append((os.path.join(folder, name), path, level + 1, rules))
+
+
+def list_directory(root: str, depth: int = 2, limit: int = LISTING_LIMIT, cache: DirectoryCache = directories) -> tuple:
+    """
+    List a directory like `iter_directory`, stopping after `limit` entries.
+
+    Returns:
+        tuple: The sorted entries, followed by a note when clipped, and the
+        paths the listing was computed from
+    """
+    result, sources = [], []
+    clipped = False
+    for entry in iter_directory(root, depth, cache, sources):
+        if len(result) == limit:
+            clipped = True
+            break
+        result.append(entry)
+    result.sort()
+    if clipped:
+        result.append(f"<response clipped> Only the first {limit} entries are shown, view a subdirectory to see more.")
+    return result, sources
+
+
+class LineIndex:
+    """
+    Memory-mapped file with the offsets of its line starts.
+
+    The offsets are found in chunks and only as far as the lines asked for,
+    so reading a range near the start of a huge file touches only that part,
+    and reading it again costs only the size of the range. Lines are numbered
+    as in the text read by `open()` and split on newlines. Threads can read
+    through the same index.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1 << 20):
+        self.path = path
+        self.stamp = None
+        self.reopen()
+        self.chunk_size = chunk_size
+        self.offsets = array("q", [0])
+        self.scanned = 0
+        self.lock = threading.RLock()
+        # Callers of the cached index, see `line_index`
+        self.users = 0
+
+    def reopen(self) -> bool:
+        """Map the file, again after `close()`, or return False if it changed since it was indexed."""
+        with open(self.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            if self.stamp is not None and stamp != self.stamp:
+                return False
+            self.stamp, self.size = stamp, stat.st_size
+            # Empty files cannot be mapped
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        return True
+
+    def extend(self, lines: int):
+        """Index at least `lines` lines, or the whole file if it has fewer."""
+        with self.lock:
+            while len(self.offsets) < lines and self.scanned < self.size:
+                start = self.scanned
+                chunk = self.data[start : start + self.chunk_size]
+                if numpy is not None:
+                    ends = numpy.flatnonzero(numpy.frombuffer(chunk, dtype=numpy.uint8) == 10)
+                    self.offsets.frombytes((ends + start + 1).astype(numpy.int64).tobytes())
+                else:
+                    end = chunk.find(b"\n")
+                    while end != -1:
+                        self.offsets.append(start + end + 1)
+                        end = chunk.find(b"\n", end + 1)
+                self.scanned += len(chunk)
+
+    def line_count(self) -> int:
+        self.extend(self.size + 2)
+        return len(self.offsets)
+
+    def has_line(self, line: int) -> bool:
+        self.extend(line)
+        return line <= len(self.offsets)
+
+    def read(self, first: int = 1, last: int = None, limit: int = None) -> str:
+        """Return lines `first` to `last` (to the end if None), at most `limit` bytes of them."""
+        with self.lock:
+            self.extend(first if last is None else last + 1)
+            start = self.offsets[first - 1]
+            end = self.offsets[last] - 1 if last is not None and last < len(self.offsets) else self.size
+        if end < self.size and end > start and self.data[end - 1] == 13:
+            end -= 1
+        if limit is not None and end - start > limit:
+            end = start + limit
+            # Do not cut a multi-byte character in half
+            while end > start and self.data[end] & 0xC0 == 0x80:
+                end -= 1
+        return self.data[start:end].decode("utf-8").replace("\r\n", "\n")
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+line_indexes = OrderedDict()
+line_indexes_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def line_index(path: str, capacity: int = 32):
+    """
+    Use the cached `LineIndex` of a file, rebuilt when the file changes.
+
+    The cache keeps the line offsets, but the file is only mapped while a
+    caller uses its index. No handle stays open between calls, so other
+    programs can replace or delete the file, also on Windows. An index that
+    is rebuilt or evicted while other threads still read it is closed when
+    the last of them is done.
+    """
+    path = os.path.abspath(path)
+    with line_indexes_lock:
+        index = line_indexes.pop(path, None)
+        if index is not None and index.stamp != toolcache.signature(path):
+            index = None
+        if index is None or (index.users == 0 and not index.reopen()):
+            index = LineIndex(path)
+        line_indexes[path] = index
+        index.users += 1
+        while len(line_indexes) > capacity:
+            line_indexes.popitem(last=False)
+    try:
+        yield index
+    finally:
+        with line_indexes_lock:
+            index.users -= 1
+            if index.users == 0:
+                index.close()
+
+
+# Real path -> lock held while a file is read, staged and replaced
+edit_locks = weakref.WeakValueDictionary()
+edit_locks_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def locked(*paths: str):
+    """
+    Hold the edit locks of files given by real path, so edits from other
+    threads cannot overwrite each other. Locks are taken in sorted order,
+    so edits of several files cannot deadlock.
+    """
+    with edit_locks_lock:
+        locks = [edit_locks.setdefault(path, threading.Lock()) for path in sorted(set(paths))]
+    with contextlib.ExitStack() as stack:
+        for lock in locks:
+            stack.enter_context(lock)
+        yield
+
+
+@contextlib.contextmanager
+def mapped(path: str):
+    """Map a file read-only, or give `b""` for an empty file."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def stage(path: str, write) -> str:
+    """Call `write` with a temporary file next to `path` and return its path, with the mode of `path`."""
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        if os.path.exists(path):
+            shutil.copymode(path, temp)
+        else:
+            os.chmod(temp, 0o644)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp)
+        raise
+    return temp
+
+
+def rename(temp: str, path: str):
+    """Move a file made by `stage()` over `path`, which must not be mapped any more as Windows refuses to replace it."""
+    try:
+        os.replace(temp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp)
+        raise
+
+
+def copy_range(f, data, start: int, end: int, chunk_size: int = 1 << 20):
+    for offset in range(start, end, chunk_size):
+        f.write(data[offset : min(offset + chunk_size, end)])
+
+
+def newline(data) -> bytes:
+    """The line break of a file, judged by its first line."""
+    end = data.find(b"\n")
+    return b"\r\n" if end > 0 and data[end - 1] == 13 else b"\n"
+
+
+def count_lines(data, start: int, end: int, chunk_size: int = 1 << 20) -> int:
+    return sum(data[offset : min(offset + chunk_size, end)].count(b"\n") for offset in range(start, end, chunk_size))
+
+
+def line_start(data, position: int, lines: int = 0) -> int:
+    """Offset of the start of the line `lines` lines above the one containing `position`."""
+    for _ in range(lines + 1):
+        position = data.rfind(b"\n", 0, position)
+        if position == -1:
+            return 0
+    return position + 1
+
+
+def line_end(data, position: int, lines: int = 0) -> int:
+    """Offset of the line break ending the line `lines` lines below the one containing `position`."""
+    for _ in range(lines + 1):
+        end = data.find(b"\n", position)
+        if end == -1:
+            return len(data)
+        position = end + 1
+    return end
+
+
+def replace(path: str, old: str, new: str, expand_tabs: bool = False) -> tuple:
+    """
+    Replace the only occurrence of `old` in a file with `new`.
+
+    The file is memory-mapped and searched once, and the result is streamed
+    to a temporary file renamed over the original once the map is closed, so
+    the extra memory does not grow with the file. Tabs and the file's line
+    breaks are kept. If `old` only matches once tabs are expanded, as shown
+    by `view`, tabs are expanded on the edited lines alone. `expand_tabs`
+    expands them in the whole file, as the editor used to.
+
+    Returns:
+        tuple: The line number of the snippet and the edited lines with 4
+        lines of context on each side
+    """
+    if not old:
+        raise ValueError("No replacement was performed, old_str is empty.")
+    target = os.path.realpath(path)
+    with locked(target):
+        with mapped(target) as data:
+            temp, result = replace_mapped(path, target, data, old, new, expand_tabs)
+        rename(temp, target)
+    return result
+
+
+def replace_mapped(path: str, target: str, data, old: str, new: str, expand_tabs: bool) -> tuple:
+    """Write the result of `replace` to a temporary file and return its path and the snippet."""
+    if expand_tabs:
+        return replace_expanded(path, target, data, old, new, expand_tabs)
+    eol = newline(data)
+    needle = encode(old, eol)
+    positions = []
+    position = data.find(needle)
+    while position != -1:
+        positions.append(position)
+        position = data.find(needle, position + len(needle))
+    if not positions and "\t" not in old and data.find(b"\t") != -1:
+        return replace_expanded(path, target, data, old, new, expand_tabs)
+    if not positions:
+        raise ValueError(f"No replacement was performed, old_str `{old}` did not appear verbatim in {path}")
+    if len(positions) > 1:
+        lines = [1]
+        for previous, position in zip([0] + positions, positions):
+            lines.append(lines[-1] + count_lines(data, previous, position))
+        raise ValueError(f"No replacement was performed. Multiple occurrences of old_str `{old}` in lines {lines[1:]}. Please ensure it is unique.")
+    start, end = positions[0], positions[0] + len(needle)
+    replacement = encode(new, eol)
+    first = line_start(data, start, 4)
+    snippet = (data[first:start] + replacement + data[end : line_end(data, end, 4)]).decode("utf-8").replace("\r\n", "\n")
+
+    def write(f):
+        copy_range(f, data, 0, start)
+        f.write(replacement)
+        copy_range(f, data, end, len(data))
+
+    return stage(target, write), (count_lines(data, 0, first) + 1, snippet)
+
+
+def replace_expanded(path: str, target: str, data, old: str, new: str, expand_tabs: bool) -> tuple:
+    """Stage the replacement of `old` matched against the file with tabs expanded, see `replace`."""
+    eol = newline(data).decode("ascii")
+    lines = data[:].decode("utf-8").split(eol)
+    expanded = "\n".join(line.expandtabs() for line in lines)
+    old = old.replace("\r\n", "\n").expandtabs()
+    new = new.replace("\r\n", "\n")
+    occurrences = expanded.count(old)
+    if occurrences == 0:
+        raise ValueError(f"No replacement was performed, old_str `{old}` did not appear verbatim in {path}")
+    if occurrences > 1:
+        numbers = [i + 1 for i, line in enumerate(expanded.split("\n")) if old in line]
+        raise ValueError(f"No replacement was performed. Multiple occurrences of old_str `{old}` in lines {numbers}. Please ensure it is unique.")
+    start = expanded.find(old)
+    end = start + len(old)
+    if expand_tabs:
+        lines = expanded[:start].split("\n")
+        replacement = lines.pop() + new.expandtabs() + expanded[end:]
+        first = len(lines)
+        lines += replacement.split("\n")
+    else:
+        first, last = expanded.count("\n", 0, start), expanded.count("\n", 0, end)
+        stop = expanded.find("\n", end)
+        replacement = expanded[expanded.rfind("\n", 0, start) + 1 : start] + new + expanded[end : len(expanded) if stop == -1 else stop]
+        lines[first : last + 1] = replacement.split("\n")
+    context = max(0, first - 4)
+    return stage(target, lambda f: f.write(eol.join(lines).encode("utf-8"))), (context + 1, "\n".join(lines[context : first + new.count("\n") + 5]))
+
+
+def insert(path: str, line: int, text: str) -> tuple:
+    """
+    Insert `text` as new lines after line `line` of a file, 0 for the top.
+
+    The insertion point is found with the file's `LineIndex` and the result
+    is streamed to a temporary file renamed over the original once the index
+    is released.
+
+    Returns:
+        tuple: The line number of the snippet and the inserted lines with 4
+        lines of context on each side
+    """
+    target = os.path.realpath(path)
+    with locked(target):
+        with line_index(target) as index:
+            if line < 0 or not index.has_line(line):
+                raise ValueError(f"Invalid `insert_line` parameter: {line}. It should be within the range of lines of the file: {[0, index.line_count()]}")
+            eol = newline(index.data)
+            text = text.replace("\r\n", "\n")
+            following = index.has_line(line + 1)
+            # Before a following line the text ends with a line break, after the last one it starts with one
+            position = index.offsets[line] if following else index.size
+            addition = encode(text, eol) + eol if following else eol + encode(text, eol)
+
+            def write(f):
+                copy_range(f, index.data, 0, position)
+                f.write(addition)
+                copy_range(f, index.data, position, index.size)
+
+            parts = ([index.read(max(1, line - 3), line)] if line > 0 else []) + [text] + ([index.read(line + 1, line + 4)] if following else [])
+            temp = stage(target, write)
+        rename(temp, target)
+    return max(1, line - 3), "\n".join(parts)
+
+
+def encode(text: str, eol: bytes) -> bytes:
+    return text.replace("\r\n", "\n").encode("utf-8").replace(b"\n", eol)
+
+
+def locate(lines: list, block: list, start: int, index: dict) -> int:
+    """
+    Return the first position at or after `start` where `block` appears in
+    `lines`, or -1.
+
+    Candidates are found with `list.index`, which compares in C. `index` maps
+    each line to its last position. It is built once a lookup misses, so
+    later blocks with a line missing from the rest of the file are rejected
+    without another scan.
+    """
+    if lines[start : start + len(block)] == block:
+        return start
+    if index and any(index.get(line, -1) < start for line in block):
+        return -1
+    try:
+        position = lines.index(block[0], start)
+        while lines[position : position + len(block)] != block:
+            position = lines.index(block[0], position + 1)
+    except ValueError:
+        if not index:
+            index.update(zip(lines, range(len(lines))))
+        return -1
+    return position
+
+
+def nearest(lines: list, block: list, start: int) -> int:
+    """Return the position at or after `start` where the most lines of `block` match, to report a hunk that does not apply."""
+    best, most = start, 0
+    for position in range(start, max(start, len(lines) - len(block)) + 1):
+        matches = sum(line == expected for line, expected in zip(lines[position : position + len(block)], block))
+        if matches > most:
+            best, most = position, matches
+    return best
+
+
+def update_lines(path: str, lines: list, hunks: list) -> list:
+    """
+    Apply the `@@` hunks of an `*** Update File` section to the lines of a file.
+
+    An `@@ text` header moves to the next line equal to `text`, if any. The
+    context and removed lines of each hunk are then looked up from there with
+    `locate()`, so hunks still apply when the file has drifted, and each part
+    of the file is scanned once. Empty lines followed by more lines of the
+    hunk are blank context lines, trailing ones are ignored.
+    """
+    result, position, index = [], 0, {}
+    old, new, kinds = [], [], []
+
+    def flush():
+        nonlocal position
+        found = locate(lines, old, position, index) if old else position
+        if found == -1:
+            found = nearest(lines, old, position)
+            for offset, (expected, kind) in enumerate(zip(old, kinds)):
+                actual = lines[found + offset] if found + offset < len(lines) else "EOF"
+                if actual != expected:
+                    break
+            raise ValueError(f"{path}: {kind} mismatch at line {found + offset + 1}: expected {repr(expected)}, found {repr(actual)}")
+        result.extend(lines[position:found])
+        result.extend(new)
+        position = found + len(old)
+        old.clear(), new.clear(), kinds.clear()
+
+    blanks = 0
+    for line in hunks:
+        if not line:
+            blanks += 1
+            continue
+        if line[0] in " -+":
+            old.extend([""] * blanks), new.extend([""] * blanks), kinds.extend(["Context"] * blanks)
+        blanks = 0
+        if line.startswith("@@"):
+            flush()
+            anchor = line[3:] if line.startswith("@@ ") else ""
+            found = locate(lines, [anchor], position, index) if anchor else -1
+            if found != -1:
+                result.extend(lines[position:found])
+                position = found
+        elif line[0] == " ":
+            old.append(line[1:]), new.append(line[1:]), kinds.append("Context")
+        elif line[0] == "-":
+            old.append(line[1:]), kinds.append("Deletion")
+        elif line[0] == "+":
+            new.append(line[1:])
+    flush()
+    result.extend(lines[position:])
+    return result
+
+
+def read_lines(path: str) -> tuple:
+    with open(path, encoding="utf-8", newline="") as f:
+        content = f.read()
+    eol = "\r\n" if "\r\n" in content[: content.find("\n") + 1] else "\n"
+    return content.replace("\r\n", "\n").split("\n"), eol
+
+
+def apply_patch(patch: str) -> list:
+    """
+    Apply a patch in the `*** Begin Patch` format to all its files or none.
+
+    Every file is first updated in memory and written to a temporary file
+    next to it. Only then are the originals moved aside and the new files
+    renamed into place, and if any step fails the originals are restored.
+    Line breaks and file modes are kept.
+
+    Returns:
+        list: The paths added, deleted or updated
+    """
+    lines = patch.strip().split("\n")
+    if not lines or not lines[0].startswith("*** Begin Patch"):
+        raise ValueError("Patch must start with '*** Begin Patch'")
+    # Other edits of the same files wait until the patch is written
+    targets = [os.path.realpath(line.split(": ", 1)[1]) for line in lines if line.startswith(("*** Add File: ", "*** Delete File: ", "*** Update File: "))]
+    with locked(*targets):
+        # Path -> (lines, line break), or None to delete, in patch order
+        changes = {}
+        paths = []
+        i = 1
+        while i < len(lines) and not lines[i].startswith("*** End Patch"):
+            command, i = lines[i], i + 1
+            start = i
+            while i < len(lines) and not lines[i].startswith("***"):
+                i += 1
+            if command.startswith("*** Add File: "):
+                path = command[14:]
+                target = os.path.realpath(path)
+                if changes.get(target) is not None or (target not in changes and os.path.exists(target)):
+                    raise FileExistsError(f"Cannot add file '{path}': file already exists")
+                changes[target] = ([line[1:] if line.startswith("+") else line for line in lines[start:i]], "\n")
+            elif command.startswith("*** Delete File: "):
+                path = command[17:]
+                # The link itself is deleted, not what it points to
+                target = os.path.join(os.path.realpath(os.path.dirname(os.path.abspath(path))), os.path.basename(path))
+                if changes.get(target, True) is None or (target not in changes and not os.path.lexists(target)):
+                    raise FileNotFoundError(f"Cannot delete file '{path}': file does not exist")
+                changes[target] = None
+            elif command.startswith("*** Update File: "):
+                path = command[17:]
+                target = os.path.realpath(path)
+                if changes.get(target, True) is None:
+                    raise FileNotFoundError(f"Cannot update file '{path}': file is deleted by the patch")
+                content, eol = changes[target] if target in changes else read_lines(target)
+                changes[target] = (update_lines(path, content, lines[start:i]), eol)
+            else:
+                continue
+            paths.append(path)
+        commit(changes)
+    return paths
+
+
+def commit(changes: dict):
+    """Write `changes` from `apply_patch` atomically as a whole, see there."""
+    temps, swapped, folders = {}, [], []
+    try:
+        for target, change in changes.items():
+            if change is None:
+                continue
+            folder = os.path.dirname(target)
+            if not os.path.isdir(folder):
+                missing = folder
+                while not os.path.isdir(os.path.dirname(missing)):
+                    missing = os.path.dirname(missing)
+                os.makedirs(folder)
+                folders.append(missing)
+            fd, temps[target] = tempfile.mkstemp(dir=folder, prefix=f".{os.path.basename(target)}.", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(change[1].join(change[0]))
+            if os.path.exists(target):
+                shutil.copymode(target, temps[target])
+            else:
+                os.chmod(temps[target], 0o644)
+        for target, change in changes.items():
+            backup = None
+            if os.path.lexists(target):
+                fd, backup = tempfile.mkstemp(dir=os.path.dirname(target), prefix=f".{os.path.basename(target)}.", suffix=".orig")
+                os.close(fd)
+                os.replace(target, backup)
+            swapped.append((target, backup))
+            if change is not None:
+                os.replace(temps.pop(target), target)
+    except BaseException:
+        for target, backup in reversed(swapped):
+            with contextlib.suppress(OSError):
+                if backup is not None:
+                    os.replace(backup, target)
+                elif os.path.lexists(target):
+                    os.unlink(target)
+        for temp in temps.values():
+            with contextlib.suppress(OSError):
+                os.unlink(temp)
+        for folder in reversed(folders):
+            shutil.rmtree(folder, ignore_errors=True)
+        raise
+    for _, backup in swapped:
+        if backup is not None:
+            with contextlib.suppress(OSError):
+                os.unlink(backup)
@@ -0,0 +1,61 @@
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token."""
+    return len(text) // 4 + 1
+
+
+def summarize(summary: str, messages: list, limit: int) -> str:
+    """Fold messages into the running summary as short excerpts, keeping the newest that fit in `limit` tokens."""
+    lines = summary.splitlines()
+    for message in messages:
+        content = " ".join(message["content"].split())
+        lines.append(f"{message['role']}: {content[:200]}{'...' if len(content) > 200 else ''}")
+    size = limit * 4
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > size:
+        lines.pop(0)
+    return "\n".join(lines)[:size]
+
+
+class History:
+    """
+    Conversation history kept within a token budget.
+
+    Recent turns are sent verbatim. Once they exceed `budget` tokens the
+    oldest turns are folded into a summary, always keeping the last `keep`
+    messages, so each request stays roughly the same size in long sessions.
+    Only newly dropped turns are summarized and the summary message is
+    reused until the next compaction. `summarizer(summary, messages, limit)`
+    can replace the default excerpt summary, e.g. with a model call.
+    """
+
+    def __init__(self, budget: int = 24000, keep: int = 4, summary_budget: int | None = None, summarizer=summarize):
+        self.budget = budget
+        self.keep = keep
+        self.summary_budget = summary_budget or budget // 4
+        self.summarizer = summarizer
+        self.summary = ""
+        self.prefix = []
+        self.turns = []
+        self.sizes = []
+        self.tokens = 0
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def append(self, role: str, content: str):
+        self.turns.append({"role": role, "content": content})
+        self.sizes.append(estimate_tokens(content))
+        self.tokens += self.sizes[-1]
+        self.compact()
+
+    def compact(self):
+        dropped = []
+        while self.tokens > self.budget and len(self.turns) > self.keep:
+            dropped.append(self.turns.pop(0))
+            self.tokens -= self.sizes.pop(0)
+        if dropped:
+            self.summary = self.summarizer(self.summary, dropped, self.summary_budget)
+            self.prefix = [{"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"}]
+
+    def messages(self) -> list:
+        """Return the messages to send: the cached summary followed by the recent turns."""
+        return self.prefix + self.turns
@@ -0,0 +1,104 @@
+import atexit
+import json
+import threading
+import time
+
+import agents
+
+
+class Recorder(agents.RunHooks):
+    """
+    Wall time and token usage of agent runs.
+
+    Passed as `hooks` to `Runner.run` or `Runner.run_streamed` it records
+    each model call with its usage and each local tool call. Iterating a
+    streamed run through `stream()` also records the turn, with its time to
+    first token and output tokens per second. Records are appended to `path`
+    as JSON lines and the totals are printed as a table at exit. Without a
+    path nothing is recorded.
+    """
+
+    def __init__(self, path: str | None = None, summary: bool = True):
+        self.path = path
+        self.enabled = bool(path)
+        self.file = None
+        self.lock = threading.Lock()
+        self.starts = {}
+        self.totals = {}
+        if self.enabled and summary:
+            atexit.register(self.close)
+
+    def record(self, kind: str, name: str, seconds: float, **fields):
+        """Append a record and add it to the totals of `kind:name`."""
+        if not self.enabled:
+            return
+        record = {"time": time.time(), "kind": kind, "name": name, "seconds": round(seconds, 6), **fields}
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "a", encoding="utf-8", buffering=1)
+            self.file.write(json.dumps(record) + "\n")
+            total = self.totals.setdefault(f"{kind}:{name}", {"calls": 0, "seconds": 0.0, "max": 0.0, "input_tokens": 0, "output_tokens": 0, "ttft": 0.0, "generating": 0.0})
+            total["calls"] += 1
+            total["seconds"] += seconds
+            total["max"] = max(total["max"], seconds)
+            for key in ("input_tokens", "output_tokens", "ttft", "generating"):
+                total[key] += fields.get(key) or 0
+
+    async def on_llm_start(self, context, agent, system_prompt, input_items):
+        self.starts[("llm", id(context))] = time.perf_counter()
+
+    async def on_llm_end(self, context, agent, response):
+        start = self.starts.pop(("llm", id(context)), None)
+        if start is not None:
+            usage = response.usage
+            self.record("llm", agent.name, time.perf_counter() - start, input_tokens=usage.input_tokens, output_tokens=usage.output_tokens)
+
+    async def on_tool_start(self, context, agent, tool):
+        # Parallel tool calls of one run share the context, the call id tells them apart
+        self.starts[("tool", getattr(context, "tool_call_id", None) or id(context), tool.name)] = time.perf_counter()
+
+    async def on_tool_end(self, context, agent, tool, result):
+        start = self.starts.pop(("tool", getattr(context, "tool_call_id", None) or id(context), tool.name), None)
+        if start is not None:
+            self.record("tool", tool.name, time.perf_counter() - start)
+
+    async def stream(self, result: agents.RunResultStreaming):
+        """Yield the events of a streamed run and record the turn when it ends."""
+        start = time.perf_counter()
+        first = None
+        async for event in result.stream_events():
+            if first is None and event.type == "raw_response_event" and event.data.type.endswith(".delta"):
+                first = time.perf_counter()
+            yield event
+        end = time.perf_counter()
+        usage = result.context_wrapper.usage
+        generating = end - first if first is not None else 0.0
+        self.record(
+            "turn",
+            result.current_agent.name,
+            end - start,
+            ttft=round(first - start, 6) if first is not None else None,
+            generating=round(generating, 6),
+            tokens_per_second=round(usage.output_tokens / generating, 1) if generating > 0 else None,
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens
+        )
+
+    def summary(self) -> str:
+        """Format the totals as a table, slowest first."""
+        lines = [f"{'name':<32} {'calls':>6} {'total s':>9} {'mean s':>8} {'max s':>8} {'ttft s':>7} {'tok/s':>7} {'in tok':>9} {'out tok':>9}"]
+        with self.lock:
+            totals = sorted(self.totals.items(), key=lambda item: -item[1]["seconds"])
+        for name, total in totals:
+            ttft = f"{total['ttft'] / total['calls']:.2f}" if name.startswith("turn:") else "-"
+            rate = f"{total['output_tokens'] / total['generating']:.1f}" if total["generating"] > 0 else "-"
+            lines.append(f"{name[:32]:<32} {total['calls']:>6} {total['seconds']:>9.2f} {total['seconds'] / total['calls']:>8.2f} {total['max']:>8.2f} {ttft:>7} {rate:>7} {total['input_tokens']:>9} {total['output_tokens']:>9}")
+        return "\n".join(lines)
+
+    def close(self):
+        """Print the summary table and close the metrics file."""
+        with self.lock:
+            file, self.file = self.file, None
+        if file is not None:
+            file.close()
+            print(f"\n{self.summary()}")
@@ -0,0 +1,224 @@
+import asyncio
+import atexit
+import hashlib
+import json
+import os
+import threading
+
+
+def fingerprint(request: dict) -> str:
+    """Key a chat completions request by its messages and tools."""
+    data = json.dumps([request.get("messages"), request.get("tools")], sort_keys=True, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def load(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def text(deltas: list, model: str = "replay") -> dict:
+    """Build a cassette entry that streams `deltas` as the assistant message."""
+    chunks = [chunk(model, {"role": "assistant", "content": delta}) for delta in deltas]
+    return {"request": {}, "stream": True, "chunks": chunks + [chunk(model, {}, "stop")]}
+
+
+def tool_call(name: str, arguments: dict, call_id: str = "call_0", model: str = "replay") -> dict:
+    """Build a cassette entry that streams a single call of the tool `name`."""
+    call = {"index": 0, "id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}}
+    chunks = [chunk(model, {"role": "assistant", "tool_calls": [call]}), chunk(model, {}, "tool_calls")]
+    return {"request": {}, "stream": True, "chunks": chunks}
+
+
+def chunk(model: str, delta: dict, finish_reason: str = None) -> dict:
+    choice = {"index": 0, "delta": delta, "finish_reason": finish_reason}
+    return {"id": "replay", "object": "chat.completion.chunk", "created": 0, "model": model, "choices": [choice]}
+
+
+class RecordedStream:
+    """Pass a chat completions stream through while collecting its chunks."""
+
+    def __init__(self, stream, done):
+        self.stream = stream
+        self.done = done
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    async def __aiter__(self):
+        chunks = []
+        try:
+            async for item in self.stream:
+                chunks.append(item.to_dict())
+                yield item
+        finally:
+            self.done(chunks)
+
+
+def record(client, path: str):
+    """
+    Append every chat completion made through `client` to the cassette at
+    `path`, one JSON line with the request and the streamed chunks or the
+    completion.
+    """
+    completions = client.chat.completions
+    create = completions.create
+    lock = threading.Lock()
+
+    def save(request: dict, **response):
+        with lock, open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"request": request, **response}, default=str) + "\n")
+
+    async def recording_create(**kwargs):
+        # Unset arguments are sentinels, only keep what identifies the request
+        request = {key: kwargs[key] for key in ("model", "messages", "tools") if isinstance(kwargs.get(key), (str, list))}
+        response = await create(**kwargs)
+        if kwargs.get("stream") is True:
+            return RecordedStream(response, lambda chunks: save(request, stream=True, chunks=chunks))
+        save(request, stream=False, completion=response.to_dict())
+        return response
+
+    completions.create = recording_create
+    return client
+
+
+class ReplayServer:
+    """
+    Local stand-in for a chat completions endpoint that serves a cassette.
+
+    Each request gets the first unserved entry recorded for the same messages
+    and tools, or else the next unserved entry, so replays survive small
+    differences in the conversation. Once every entry has been served the
+    cassette starts over. Streamed entries wait `latency` seconds before the
+    first chunk and `token_latency` seconds before each following one. New
+    connections are held for `handshake` seconds to model the TCP and TLS
+    setup a remote API costs, kept-alive connections skip that delay. The
+    server runs on its own thread and event loop.
+    """
+
+    def __init__(self, entries, latency: float = 0.0, token_latency: float = 0.0, handshake: float = 0.0, port: int = 0):
+        self.entries = load(entries) if isinstance(entries, str) else list(entries)
+        self.keys = [fingerprint(entry["request"]) for entry in self.entries]
+        self.pending = []
+        self.latency = latency
+        self.token_latency = token_latency
+        self.handshake = handshake
+        self.port = port
+        self.connections = 0
+        self.requests = 0
+        self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    async def __aenter__(self):
+        return self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self.serve, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def serve(self, ready: threading.Event):
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(asyncio.start_server(self.handle, "127.0.0.1", self.port))
+        self.base_url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1/"
+        ready.set()
+        self.loop.run_forever()
+        server.close()
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.close()
+
+    def close(self):
+        if self.thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.thread = None
+
+    def match(self, request: dict) -> dict:
+        if not self.pending:
+            self.pending = list(range(len(self.entries)))
+        key = fingerprint(request)
+        index = next((i for i in self.pending if self.keys[i] == key), self.pending[0])
+        self.pending.remove(index)
+        return self.entries[index]
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            await asyncio.sleep(self.handshake)
+            while line := await reader.readline():
+                method, target = line.decode("latin-1").split()[:2]
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, value = line.decode("latin-1").split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                if method != "POST" or not target.endswith("/chat/completions") or not self.entries:
+                    error = json.dumps({"error": {"message": f"No recorded response for {method} {target}"}}).encode("utf-8")
+                    writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(error), error))
+                    await writer.drain()
+                    continue
+                self.requests += 1
+                entry = self.match(json.loads(body or b"{}"))
+                if not entry.get("stream"):
+                    await asyncio.sleep(self.latency)
+                    data = json.dumps(entry["completion"]).encode("utf-8")
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(data), data))
+                    await writer.drain()
+                    continue
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+                # No [DONE] event: the openai client closes the response as soon
+                # as it sees one, which discards the connection instead of
+                # returning it to the pool
+                for number, item in enumerate(entry["chunks"]):
+                    await asyncio.sleep(self.token_latency if number else self.latency)
+                    event = f"data: {json.dumps(item)}\n\n".encode("utf-8")
+                    writer.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+                    await writer.drain()
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Cancelled when the server closes with kept-alive connections open
+            pass
+        finally:
+            writer.close()
+
+
+server = None
+
+
+def connect(client):
+    """
+    Apply the record and replay settings to an `openai.AsyncOpenAI` client.
+
+    With `AGENT_REPLAY` set to a cassette the client is pointed at a shared
+    `ReplayServer`, paced by `AGENT_REPLAY_LATENCY` and
+    `AGENT_REPLAY_TOKEN_LATENCY` in seconds. With `AGENT_RECORD` set to a
+    path its chat completions are appended there.
+    """
+    global server
+    if os.getenv("AGENT_REPLAY"):
+        if server is None:
+            server = ReplayServer(
+                os.getenv("AGENT_REPLAY"),
+                latency=float(os.getenv("AGENT_REPLAY_LATENCY", "0")),
+                token_latency=float(os.getenv("AGENT_REPLAY_TOKEN_LATENCY", "0"))
+            ).start()
+            atexit.register(server.close)
+        client = client.with_options(base_url=server.base_url)
+    if os.getenv("AGENT_RECORD"):
+        record(client, os.getenv("AGENT_RECORD"))
+    return client
@@ -1,5 +1,9 @@
 
 import asyncio
+import os
+import random
+import re
+import sqlite3
 import sys
 import threading
 import time
@@ -7,6 +11,8 @@ import time
 import agents
 import pydantic
 
+import metrics
+
 
 class Progress:
 
@@ -38,6 +44,165 @@ class Progress:
         self.thread = None
         thread.join()
 
+class Scheduler:
+    """
+    Runs calls on a bounded pool with deadlines, retries and hedging.
+
+    At most `concurrency` attempts run at once and each gets `timeout`
+    seconds. A failed attempt is retried up to `retries` times after a
+    jittered exponential backoff starting at `backoff` seconds. An attempt
+    still running after `hedge` seconds gets a duplicate, if a slot is free
+    and no other call is waiting for one, and the first to succeed wins. A
+    call that fails every attempt, or runs past `deadline` seconds, returns
+    None so the caller can go on without it. Time spent waiting for a slot
+    counts against neither the hedge delay nor the deadline.
+    """
+
+    def __init__(self, concurrency: int = 4, timeout: float = 60, retries: int = 2, backoff: float = 1.0, hedge: float | None = 30, deadline: float | None = 180):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.deadline = deadline
+        self.attempts = 0
+        self.hedges = 0
+        self.failures = 0
+
+    def remaining(self, clock: dict) -> float:
+        """Seconds left before the deadline of a call, which starts when its first attempt gets a slot."""
+        if self.deadline is None or "start" not in clock:
+            return float("inf")
+        return clock["start"] + self.deadline - asyncio.get_running_loop().time()
+
+    async def attempt(self, clock: dict, running: asyncio.Event, function, *args):
+        async with self.semaphore:
+            clock.setdefault("start", asyncio.get_running_loop().time())
+            timeout = min(self.timeout, self.remaining(clock))
+            if timeout <= 0:
+                raise TimeoutError("Deadline exceeded")
+            self.attempts += 1
+            running.set()
+            return await asyncio.wait_for(function(*args), timeout)
+
+    async def hedged(self, clock: dict, function, *args):
+        """Run an attempt, and a duplicate once it has run longer than `hedge` seconds, returning the first success."""
+        running = asyncio.Event()
+        primary = asyncio.create_task(self.attempt(clock, running, function, *args))
+        pending = {primary}
+        try:
+            if self.hedge is not None:
+                # The hedge delay starts once the attempt holds a slot
+                started = asyncio.create_task(running.wait())
+                await asyncio.wait({primary, started}, return_when=asyncio.FIRST_COMPLETED)
+                started.cancel()
+                while not primary.done():
+                    done, _ = await asyncio.wait({primary}, timeout=self.hedge)
+                    # A duplicate must not take a slot from a call that has not started
+                    if not done and not self.semaphore.locked():
+                        self.hedges += 1
+                        pending.add(asyncio.create_task(self.attempt(clock, asyncio.Event(), function, *args)))
+                        break
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def retried(self, function, *args):
+        clock = {}
+        for retry in range(self.retries + 1):
+            try:
+                return await self.hedged(clock, function, *args)
+            except Exception:
+                if retry == self.retries or self.remaining(clock) <= 0:
+                    raise
+            # Full jitter keeps retries of a burst from hitting the rate limit together
+            await asyncio.sleep(min(random.uniform(0, self.backoff * 2 ** retry), max(self.remaining(clock), 0)))
+
+    async def call(self, function, *args):
+        """Await `function(*args)` under the pool's limits, or return None if it keeps failing."""
+        try:
+            return await self.retried(function, *args)
+        except Exception:
+            self.failures += 1
+            return None
+
+# Words that do not change what a search finds
+STOPWORDS = {"a", "an", "and", "are", "as", "at", "by", "for", "from", "how", "in", "is", "of", "on", "or", "the", "to", "vs", "what", "with"}
+
+def normalize(query: str) -> str:
+    """Key a query by its lowercase words in order, without punctuation or stopwords, so "python to java" and "java to python" differ."""
+    words = [word for word in re.findall(r"\w+", query.lower()) if word not in STOPWORDS]
+    return " ".join(words) or query.strip().lower()
+
+def deduplicate(searches: list, threshold: float = 0.8) -> list:
+    """
+    Drop searches whose normalized words and pairs of adjacent words overlap
+    an earlier one's by `threshold` or more (Jaccard), within one plan. The
+    pairs keep the word order, so "python to java" and "java to python" are
+    both searched.
+    """
+    kept = []
+    for item in searches:
+        sequence = normalize(item.query).split()
+        features = set(sequence) | set(zip(sequence, sequence[1:]))
+        if all(len(features & other) < threshold * len(features | other) or not features for _, other in kept):
+            kept.append((item, features))
+    return [item for item, _ in kept]
+
+class SearchCache:
+    """
+    Search summaries kept across runs in a SQLite database, by normalized query.
+
+    Entries older than `ttl` seconds are ignored and removed. Beyond
+    `capacity` entries the least recently used are evicted. Without a path
+    nothing is cached.
+    """
+
+    def __init__(self, path: str | None = None, ttl: float = 7 * 24 * 3600, capacity: int = 1000):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.hits = 0
+        self.connection = None
+        if path:
+            self.connection = sqlite3.connect(path)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS searches (key TEXT PRIMARY KEY, summary TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS searches_used ON searches (used)")
+
+    def get(self, query: str) -> str | None:
+        if self.connection is None:
+            return None
+        now = time.time()
+        with self.connection:
+            self.connection.execute("DELETE FROM searches WHERE created < ?", (now - self.ttl,))
+            row = self.connection.execute("SELECT summary FROM searches WHERE key = ?", (normalize(query),)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE searches SET used = ? WHERE key = ?", (now, normalize(query)))
+        self.hits += 1
+        return row[0]
+
+    def put(self, query: str, summary: str):
+        if self.connection is None:
+            return
+        now = time.time()
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?)", (normalize(query), summary, now, now))
+            self.connection.execute("DELETE FROM searches WHERE key IN (SELECT key FROM searches ORDER BY used DESC LIMIT -1 OFFSET ?)", (self.capacity,))
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
 class SearchQuery(pydantic.BaseModel):
     reason: str = pydantic.Field(description="One‑sentence rationale why this query advances the user’s goal.")
     query: str = pydantic.Field("Exact phrase to paste into the search engine.")
@@ -53,15 +218,18 @@ async def main():
     user_prompt = sys.argv[1] if len(sys.argv) > 1 else None
     user_request = input("\U0001F464 User: ") if not user_prompt else user_prompt
     model_settings = agents.ModelSettings(reasoning={"effort": "low"})
+    recorder = metrics.Recorder(os.getenv("AGENT_METRICS"))
     with Progress("\U0001F916 Planning"):
         prompt = """You are a research planning assistant.
 Given a query, create a set of web searches to find content to best answer the query.
 Output between 10 and 20 terms to query for."""
         agent = agents.Agent(name="Plan", instructions=prompt, model="gpt-5.2", tools=[agents.WebSearchTool()], model_settings=model_settings, output_type=SearchPlan)
-        result = await agents.Runner.run(agent, f"Query: {user_request}")
+        result = await agents.Runner.run(agent, f"Query: {user_request}", hooks=recorder)
         plan = result.final_output_as(SearchPlan)
-    for item in plan.searches:
+    searches = deduplicate(plan.searches)
+    for item in searches:
         print(f'\033[90m   {item.query}\033[0m')
+    cache = SearchCache(os.getenv("RESEARCH_CACHE"), ttl=float(os.getenv("RESEARCH_CACHE_TTL", "604800")), capacity=int(os.getenv("RESEARCH_CACHE_SIZE", "1000")))
     with Progress("\U0001F50D Searching") as spinner:
         prompt = """You are a research assistant. Search the web based on a given search term and produce a concise summary of the results.
     The summary must be 2-3 paragraphs and less than 300 words. Capture the main points. Write succinctly, no need to have complete sentences or good grammar.
@@ -69,17 +237,31 @@ Output between 10 and 20 terms to query for."""
     Do not include any additional commentary other than the summary itself."""
         agent = agents.Agent(name="Search", instructions=prompt, model="gpt-5-mini", tools=[agents.WebSearchTool()], model_settings=agents.ModelSettings(tool_choice="required"))
         async def search_item(item: SearchQuery) -> str:
-            result = await agents.Runner.run(agent, f"Search term: {item.query}\nReason for searching: {item.reason}")
-            return str(result.final_output)
+            summary = cache.get(item.query)
+            if summary is None:
+                result = await agents.Runner.run(agent, f"Search term: {item.query}\nReason for searching: {item.reason}", hooks=recorder)
+                summary = str(result.final_output)
+                cache.put(item.query, summary)
+            return summary
+        scheduler = Scheduler(
+            concurrency=int(os.getenv("RESEARCH_CONCURRENCY", "4")),
+            timeout=float(os.getenv("RESEARCH_TIMEOUT", "60")),
+            retries=int(os.getenv("RESEARCH_RETRIES", "2")),
+            hedge=float(os.getenv("RESEARCH_HEDGE", "30")) or None,
+            deadline=float(os.getenv("RESEARCH_DEADLINE", "180")) or None
+        )
         completed = 0
-        tasks = [asyncio.create_task(search_item(item)) for item in plan.searches]
+        tasks = [asyncio.create_task(scheduler.call(search_item, item)) for item in searches]
         search_results = []
         for task in asyncio.as_completed(tasks):
             result = await task
             if result is not None:
                 search_results.append(result)
             completed += 1
-            spinner.status = f"({completed}/{len(tasks)} completed)"
+            cached = f", {cache.hits} cached" if cache.hits else ""
+            failed = f", {scheduler.failures} failed" if scheduler.failures else ""
+            spinner.status = f"({completed}/{len(tasks)} completed{cached}{failed})"
+        cache.close()
     with Progress("\U0001F4DD Summarizing"):
         prompt = """You are a senior researcher tasked with writing a cohesive report for a user query.
 You will be provided with the original query, and initial research done by a research assistant.
@@ -87,10 +269,11 @@ First create an outline that describes the structure and flow of the report.
 Then, generate the report and return that as your final output.
 The final output should be detailed in markdown format with for 5-10 pages of content, at least 1000 words."""
         agent = agents.Agent(name="Summary", instructions=prompt, model="gpt-5.2", model_settings=model_settings, output_type=Report)
-        result = await agents.Runner.run(agent, f"Original query: {user_request}\nSummarized search results: {search_results}")
+        result = await agents.Runner.run(agent, f"Original query: {user_request}\nSummarized search results: {search_results}", hooks=recorder)
         report = result.final_output_as(Report)
     print(f"\n\n{report.summary}\n")
     print(f"{report.report}")
+    recorder.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
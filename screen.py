@@ -0,0 +1,104 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+
+from PIL import Image
+
+try:
+    import mss
+except ImportError:
+    mss = None
+
+# Widest screenshot sent to the model, 0 for the full resolution
+SCREENSHOT_WIDTH = int(os.getenv("CUA_SCREENSHOT_WIDTH", "1280"))
+# png, jpeg or webp
+SCREENSHOT_FORMAT = os.getenv("CUA_SCREENSHOT_FORMAT", "png").lower()
+SCREENSHOT_QUALITY = int(os.getenv("CUA_SCREENSHOT_QUALITY", "80"))
+SCREENSHOT_REUSE = os.getenv("CUA_SCREENSHOT_REUSE", "1") != "0"
+
+local = threading.local()
+
+
+def grab() -> Image.Image:
+    """Capture the primary monitor, with mss when it is installed as it is several times faster than pyautogui."""
+    if mss is None:
+        import pyautogui
+        return pyautogui.screenshot()
+    # mss handles are bound to the thread that opened them
+    if getattr(local, "mss", None) is None:
+        local.mss = mss.mss()
+    shot = local.mss.grab(local.mss.monitors[1])
+    return Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+
+def fingerprint(image: Image.Image) -> bytes:
+    """
+    Hash a grayscale thumbnail at 1/8 of the size of `image`. Each thumbnail
+    pixel averages an 8x8 block, so a caret or a typed character still changes
+    it while the hash costs a fraction of an encode.
+    """
+    thumbnail = image.convert("L").reduce(8) if min(image.size) >= 8 else image.convert("L")
+    return hashlib.blake2b(thumbnail.tobytes(), digest_size=16).digest()
+
+
+def encode(image: Image.Image, format: str = SCREENSHOT_FORMAT, quality: int = SCREENSHOT_QUALITY) -> bytes:
+    buffer = io.BytesIO()
+    if format == "jpeg":
+        image.convert("RGB").save(buffer, format="JPEG", quality=quality, optimize=True)
+    elif format == "webp":
+        # Method 0 encodes several times faster than the default for slightly larger files
+        image.save(buffer, format="WEBP", quality=quality, method=0)
+    else:
+        # Screenshots are mostly flat areas, a fast zlib level loses little size
+        image.save(buffer, format="PNG", compress_level=3)
+    return buffer.getvalue()
+
+
+class Screen:
+    """
+    Screenshots for a computer-use model, in the coordinates it sees.
+
+    Frames are downscaled to at most `width` pixels wide and encoded as PNG,
+    JPEG or WebP. `dimensions` is the size of the frames the model gets and
+    `point()` maps a position in them back to the `size` of the screen that
+    mouse actions use, which also covers displays whose pixels differ from
+    their logical size. When a frame hashes the same as the previous one, the
+    previous encoding is sent again without resizing or encoding.
+    """
+
+    def __init__(self, size: tuple, capture=grab, width: int = SCREENSHOT_WIDTH, format: str = SCREENSHOT_FORMAT, quality: int = SCREENSHOT_QUALITY, reuse: bool = SCREENSHOT_REUSE):
+        self.size = tuple(size)
+        self.capture = capture
+        self.format = format
+        self.quality = quality
+        self.reuse = reuse
+        self.last = None
+        self.captures = 0
+        self.reused = 0
+        self.bytes = 0
+        frame = capture().size
+        scale = min(1.0, width / frame[0]) if width else 1.0
+        self.dimensions = (max(1, round(frame[0] * scale)), max(1, round(frame[1] * scale)))
+
+    def point(self, x: int, y: int) -> tuple:
+        """Map a position in the screenshot to the screen."""
+        return round(x * self.size[0] / self.dimensions[0]), round(y * self.size[1] / self.dimensions[1])
+
+    def screenshot(self) -> str:
+        """Capture, downscale and encode a frame as base64."""
+        image = self.capture()
+        self.captures += 1
+        key = fingerprint(image) if self.reuse else None
+        if key is not None and self.last is not None and self.last[0] == key:
+            self.reused += 1
+            return self.last[1]
+        if image.size != self.dimensions:
+            # Box-reduce by the integer part of the scale first, Lanczos on a 4K frame costs 10x more
+            image = image.resize(self.dimensions, Image.Resampling.LANCZOS, reducing_gap=1.0)
+        data = encode(image, self.format, self.quality)
+        self.bytes += len(data)
+        result = base64.b64encode(data).decode("ascii")
+        self.last = (key, result)
+        return result
@@ -0,0 +1,237 @@
+import asyncio
+import codecs
+import functools
+import os
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+OUTPUT_LIMIT = int(os.getenv("AGENT_OUTPUT_LIMIT", "32768"))
+# Tool calls of one agent that may run at once
+PARALLEL_TOOLS = int(os.getenv("AGENT_PARALLEL_TOOLS", "4"))
+
+
+class OutputBuffer:
+    """
+    Bounded capture of a process output stream.
+
+    Keeps the first and last `limit // 2` bytes and counts the bytes dropped
+    in between, so a chatty command cannot exhaust memory or the model
+    context. With `echo` the output is forwarded to the console as it arrives.
+    """
+
+    def __init__(self, limit: int = OUTPUT_LIMIT, echo: bool = False, hide: bytes | None = None):
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.dropped = 0
+        self.echo = echo
+        self.hide = hide
+        self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+
+    def write(self, chunk: bytes):
+        if self.echo:
+            # Output from `hide` onwards is bookkeeping, not for the console
+            text = self.decoder.decode(chunk.split(self.hide)[0] if self.hide else chunk)
+            if text:
+                sys.stdout.write(f"\033[90m{text}\033[0m")
+                sys.stdout.flush()
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head.extend(chunk[:room])
+            chunk = chunk[room:]
+        self.tail.extend(chunk)
+        if len(self.tail) > self.tail_limit:
+            excess = len(self.tail) - self.tail_limit
+            del self.tail[:excess]
+            self.dropped += excess
+
+    def last(self, size: int) -> bytes:
+        data = bytes(self.tail[-size:])
+        if len(data) < size and not self.dropped:
+            data = bytes(self.head[len(data) - size:]) + data
+        return data
+
+    def getvalue(self) -> str:
+        head = self.head.decode("utf-8", "replace")
+        tail = self.tail.decode("utf-8", "replace")
+        if self.dropped:
+            return f"{head}\n[... {self.dropped} bytes truncated ...]\n{tail}"
+        return head + tail
+
+
+def truncate(text: str, limit: int = OUTPUT_LIMIT) -> str:
+    """Apply the head and tail capture of `OutputBuffer` to a string."""
+    buffer = OutputBuffer(limit)
+    buffer.write(text.encode("utf-8"))
+    return buffer.getvalue()
+
+
+def run(args, shell: bool = False, cwd: str | None = None, timeout: float | None = None, limit: int = OUTPUT_LIMIT, echo: bool = False) -> subprocess.CompletedProcess:
+    """
+    Run a process like `subprocess.run(..., capture_output=True, text=True)`
+    but read its output in chunks into bounded `OutputBuffer`s.
+
+    Children left running in the background, such as a server started with
+    `&`, can hold the pipes open after the process exits. Their output is
+    read until `timeout` seconds after the start, then what was captured is
+    returned and they are left running.
+    """
+    # A new session lets a timeout kill the whole process group, so children
+    # of a shell cannot keep the pipes open
+    group = hasattr(os, "killpg")
+    deadline = None if timeout is None else time.monotonic() + timeout
+    process = subprocess.Popen(args, shell=shell, cwd=cwd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=group)
+    buffers = [OutputBuffer(limit, echo), OutputBuffer(limit, echo)]
+    readers = [threading.Thread(target=copy, args=(stream, buffer), daemon=True) for stream, buffer in zip((process.stdout, process.stderr), buffers)]
+    for reader in readers:
+        reader.start()
+    try:
+        returncode = process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        if group:
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+        process.wait()
+        raise
+    finally:
+        for reader in readers:
+            reader.join(None if deadline is None else max(0, deadline - time.monotonic()))
+    return subprocess.CompletedProcess(args, returncode, buffers[0].getvalue(), buffers[1].getvalue())
+
+
+def copy(stream, buffer: OutputBuffer):
+    while chunk := os.read(stream.fileno(), 65536):
+        buffer.write(chunk)
+
+
+class ShellSession:
+    """
+    Long-lived bash process that commands are fed through.
+
+    The working directory, environment variables and activated virtualenvs
+    persist across commands. Each command is followed by a unique marker so
+    its end and exit code can be detected without waiting for the process to
+    exit. A command that runs past its timeout restarts the shell. Output is
+    captured in `OutputBuffer`s capped at `limit` bytes per stream.
+    """
+
+    def __init__(self, cwd: str | None = None, timeout: float = 30, limit: int = OUTPUT_LIMIT, echo: bool = False):
+        self.cwd = cwd
+        self.timeout = timeout
+        self.limit = limit
+        self.echo = echo
+        self.process = None
+        self.lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.buffers = {}
+
+    @staticmethod
+    def available() -> bool:
+        return shutil.which("bash") is not None and hasattr(os, "killpg")
+
+    def directory(self) -> str | None:
+        """The working directory of the shell, or None when it is not running or the platform does not expose it."""
+        process = self.process
+        if process is None:
+            return None
+        try:
+            return os.readlink(f"/proc/{process.pid}/cwd")
+        except OSError:
+            return None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            ["bash", "--noprofile", "--norc"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.cwd,
+            start_new_session=True,
+        )
+        self.buffers = {"stdout": [OutputBuffer(self.limit)], "stderr": [OutputBuffer(self.limit)]}
+        for name, current in self.buffers.items():
+            threading.Thread(target=self.read, args=(self.process, getattr(self.process, name), current), daemon=True).start()
+
+    def read(self, process: subprocess.Popen, stream, current: list):
+        # `current` holds the buffer of the running command, swapped per command
+        while chunk := os.read(stream.fileno(), 65536):
+            with self.condition:
+                current[0].write(chunk)
+                self.condition.notify_all()
+        # The shell closed its output, wake `run()` once it can see the exit
+        process.wait()
+        with self.condition:
+            self.condition.notify_all()
+
+    def run(self, command: str, timeout: float | None = None) -> subprocess.CompletedProcess:
+        """Run a command in the session and return its exit code, stdout and stderr."""
+        timeout = timeout or self.timeout
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self.start()
+            marker = f"__SHELL_SESSION_{uuid.uuid4().hex}__"
+            # The command is a quoted argument of eval, so a syntax error or an
+            # unterminated quote or here-doc fails the command instead of ending
+            # the shell or swallowing the marker lines. It reads from /dev/null
+            # so it cannot consume them either.
+            script = f"eval {shlex.quote(command)} < /dev/null\nprintf '%s %d\\n' {marker} $?\nprintf '%s\\n' {marker} >&2\n"
+            token = marker.encode("ascii")
+            with self.condition:
+                stdout = self.buffers["stdout"][0] = OutputBuffer(self.limit, self.echo, token)
+                stderr = self.buffers["stderr"][0] = OutputBuffer(self.limit, self.echo, token)
+            try:
+                self.process.stdin.write(script.encode("utf-8"))
+                self.process.stdin.flush()
+            except OSError:
+                pass
+            with self.condition:
+                done = self.condition.wait_for(lambda: (token in stdout.last(len(token) + 16) and token in stderr.last(len(token) + 2)) or self.process.poll() is not None, timeout)
+                out, err = stdout.getvalue(), stderr.getvalue()
+            if not done:
+                self.close()
+                raise subprocess.TimeoutExpired(command, timeout, out, err)
+            if marker not in out:
+                # The command ended the shell, e.g. with `exit`
+                returncode = self.process.wait()
+                self.process = None
+                return subprocess.CompletedProcess(command, returncode, out, err)
+            out, status = out.rsplit(marker, 1)
+            err = err.rsplit(marker, 1)[0]
+            return subprocess.CompletedProcess(command, int(status.split()[0]), out, err)
+
+    def close(self):
+        """Stop the shell and any processes it started."""
+        if self.process is not None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+            self.process.wait()
+            self.process = None
+
+
+def offload(slots):
+    """
+    Turn a blocking tool function into a coroutine function that runs it on
+    a worker thread, so the event loop keeps streaming and the tool calls of
+    one turn overlap. `slots` is an `asyncio.Semaphore` bounding the calls in
+    flight, or a function of the call arguments that returns one. The
+    signature and docstring are kept for the tool schema. Calls that go
+    through one `ShellSession` still run one at a time, as the session's lock
+    serializes its commands.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            async with slots(*args, **kwargs) if callable(slots) else slots:
+                return await asyncio.to_thread(function, *args, **kwargs)
+        return wrapper
+    return decorator
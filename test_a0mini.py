@@ -45,6 +45,367 @@ def test_agent_context():
     print("✓ AgentContext class structure verified")
 
 
+def load_a0mini():
+    """Import a0mini if its dependencies are installed, otherwise return None."""
+    try:
+        import a0mini
+        return a0mini
+    except ImportError:
+        print("⚠ Skipped: openai-agents package not installed")
+        return None
+
+
+def test_memory_search():
+    """Test ranked keyword search over AgentMemory."""
+    print("Testing AgentMemory search...")
+    
+    a0mini = load_a0mini()
+    if a0mini is None:
+        return
+    
+    memory = a0mini.AgentMemory()
+    memory.add_memory("Use a virtualenv before installing packages")
+    memory.add_memory("Python asyncio tasks run concurrently, python threads do not")
+    memory.add_memory("Docker compose starts the database")
+    memory.add_memory("Python packaging notes")
+    
+    results = memory.search_memories("python asyncio", limit=2)
+    assert [m["content"] for m in results] == [
+        "Python asyncio tasks run concurrently, python threads do not",
+        "Python packaging notes",
+    ], "Should rank by relevance"
+    assert memory.search_memories("kubernetes") == [], "Should not match unknown words"
+    assert len(memory.search_memories("python", limit=1)) == 1, "Should honor limit"
+    
+    # Terms found in most memories still count towards the ranking
+    memory = a0mini.AgentMemory()
+    for content in ("python asyncio guide", "python threads", "asyncio in rust"):
+        memory.add_memory(content)
+    results = [m["content"] for m in memory.search_memories("python asyncio")]
+    assert results[0] == "python asyncio guide" and "asyncio in rust" in results, f"Should score every query term, got {results}"
+    
+    index = a0mini.KeywordIndex(candidates=3)
+    index.add(0, "common rare word")
+    for doc_id in range(1, 10):
+        index.add(doc_id, "common word")
+    assert index.search("common rare", limit=2) == [0, 9], "Should still score earlier candidates for a common term"
+    assert index.search("common", limit=3) == [9, 8, 7], "Should bound the candidates a common term adds"
+    
+    print("✓ Memory search tests passed")
+
+
+def test_vector_memory_search():
+    """Test embedding similarity search over AgentMemory."""
+    print("Testing AgentMemory vector search...")
+    
+    a0mini = load_a0mini()
+    if a0mini is None or a0mini.numpy is None:
+        print("⚠ Skipped: numpy not installed")
+        return
+    
+    memory = a0mini.AgentMemory(index=a0mini.VectorIndex(capacity=1))
+    memory.add_memory("How to parse JSON files in Python")
+    memory.add_memory("Restart the nginx web server")
+    memory.add_memory("Weekly grocery shopping list")
+    
+    assert len(memory.index.matrix) == 4, "Matrix should grow by doubling"
+    results = memory.search_memories("parsing a json file", limit=1)
+    assert results[0]["content"] == "How to parse JSON files in Python", "Should find the most similar memory"
+    assert len(memory.search_memories("nginx server", limit=10)) <= 3, "Should not return more than stored"
+    
+    print("✓ Vector memory search tests passed")
+
+
+def test_memory_store():
+    """Test that memories persist across AgentMemory instances."""
+    print("Testing MemoryStore persistence...")
+    
+    a0mini = load_a0mini()
+    if a0mini is None:
+        return
+    
+    import os
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "memory.db")
+        memory = a0mini.AgentMemory(store=a0mini.MemoryStore(path, batch_size=2))
+        memory.add_memory("The staging server runs on port 8080", {"category": "fact"})
+        memory.add_solution("flaky test", "pin the random seed")
+        memory.add_solution("slow build", "enable caching", success=False)
+        memory.close()
+        
+        restored = a0mini.AgentMemory(store=a0mini.MemoryStore(path))
+        assert restored.loaded == set(), "Should not read the store on startup"
+        assert len(restored.memories) == 0, "Should not read the store on startup"
+        results = restored.search_memories("staging port")
+        assert results[0]["metadata"] == {"category": "fact"}, "Should restore memories"
+        assert [s["solution"] for s in restored.get_recent_solutions()] == ["pin the random seed"], "Should restore solutions"
+        restored.close()
+    
+    print("✓ Memory store tests passed")
+
+
+def test_memory_eviction():
+    """Test capacity limits and eviction policies of AgentMemory."""
+    print("Testing AgentMemory eviction...")
+    
+    a0mini = load_a0mini()
+    if a0mini is None:
+        return
+    
+    memory = a0mini.AgentMemory(capacity=2, policy="lru")
+    memory.add_memory("alpha notes")
+    memory.add_memory("beta notes")
+    memory.search_memories("alpha")
+    memory.add_memory("gamma notes")
+    assert [m.content for m in memory.memories] == ["alpha notes", "gamma notes"], "LRU should evict the least recently used"
+    assert memory.search_memories("beta") == [], "Evicted memories should leave the index"
+    
+    memory = a0mini.AgentMemory(capacity=2, policy="lfu")
+    memory.add_memory("alpha notes")
+    memory.add_memory("beta notes")
+    memory.search_memories("alpha")
+    memory.search_memories("alpha")
+    memory.search_memories("beta")
+    memory.add_memory("gamma notes")
+    assert [m.content for m in memory.memories] == ["alpha notes", "gamma notes"], "LFU should evict the least frequently used"
+    
+    memory = a0mini.AgentMemory(policy="ttl", ttl=60)
+    memory.add_memory("stale notes")
+    next(iter(memory.memories)).timestamp -= 120
+    assert memory.search_memories("notes") == [], "TTL should expire old memories"
+    
+    context = a0mini.AgentContext(log_capacity=3)
+    for i in range(5):
+        context.log(f"message {i}")
+    assert [entry.message for entry in context.logs] == ["message 2", "message 3", "message 4"], "Logs should be bounded"
+    
+    report = memory.report()
+    assert report["memories"] == 0 and report["memory_bytes"] > 0, "Should report the memory footprint"
+    
+    print("✓ Memory eviction tests passed")
+
+
+def test_recent_solutions():
+    """Test the recent solution ring buffer and problem search."""
+    print("Testing AgentMemory solutions...")
+    
+    a0mini = load_a0mini()
+    if a0mini is None:
+        return
+    
+    memory = a0mini.AgentMemory(capacity=4, recent_limit=3)
+    memory.add_solution("flaky network test", "retry with backoff")
+    memory.add_solution("slow docker build", "use a build cache")
+    memory.add_solution("broken migration", "manual fix", success=False)
+    memory.add_solution("memory leak in worker", "recycle workers")
+    memory.add_solution("slow test suite", "run tests in parallel")
+    
+    recent = [s.solution for s in memory.get_recent_solutions(limit=5)]
+    assert recent == ["use a build cache", "recycle workers", "run tests in parallel"], "Should return recent successes oldest first"
+    assert [s.solution for s in memory.get_recent_solutions(limit=1)] == ["run tests in parallel"], "Should honor limit"
+    
+    results = memory.search_solutions("slow build")
+    assert results[0].solution == "use a build cache", "Should find solutions by problem"
+    assert all(s.problem != "flaky network test" for s in memory.search_solutions("flaky network")), "Evicted solutions should leave the index"
+    
+    print("✓ Solution tests passed")
+
+
+def test_log_writer():
+    """Test batched JSON lines logging with level filtering."""
+    print("Testing LogWriter...")
+    
+    a0mini = load_a0mini()
+    if a0mini is None:
+        return
+    
+    import json
+    import os
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "agent.log")
+        writer = a0mini.LogWriter(path=path, level="info", echo=False)
+        context = a0mini.AgentContext(log_writer=writer)
+        subordinate = context.create_subordinate()
+        context.log("hidden", level="debug")
+        context.log("started")
+        subordinate.log("failed", level="error")
+        writer.close()
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+    
+    assert [r["message"] for r in records] == ["started", "failed"], "Should filter levels and keep order"
+    assert records[1]["agent_id"] == "0.0", "Subordinates should share the writer"
+    assert [r.message for r in context.logs] == ["started"], "Should keep filtered records out of history"
+    
+    context = a0mini.AgentContext(log_writer=a0mini.LogWriter(echo=True))
+    context.log("shared")
+    context.close()
+    assert context.log_writer.thread is not None, "Should leave a writer it was given to its owner"
+    context.log_writer.close()
+    context = a0mini.AgentContext()
+    context.log("closed")
+    thread = context.log_writer.thread
+    context.close()
+    assert context.log_writer.thread is None and not thread.is_alive(), "Should close a writer the context created"
+    
+    import subprocess
+    import sys
+    script = "import a0mini; a0mini.AgentContext().log('exiting')"
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=60, cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert "[Agent 0] exiting" in result.stdout, f"Should flush queued records at exit, got {result.stdout!r} {result.stderr[-500:]!r}"
+    
+    print("✓ Log writer tests passed")
+
+
+def test_pooled_client():
+    """Test that AgentZeroMini builds its client and agent once."""
+    print("Testing pooled client...")
+    
+    a0mini = load_a0mini()
+    if a0mini is None:
+        return
+    
+    import asyncio
+    
+    async def run():
+        async with a0mini.AgentZeroMini(api_key="test", keepalive_expiry=120.0, log_writer=a0mini.LogWriter(echo=False)) as zero:
+            assert zero.agent.model._client is zero.client, "Agent should use the pooled client"
+    
+    asyncio.run(run())
+    
+    print("✓ Pooled client tests passed")
+
+
+def test_delegation():
+    """Test concurrent delegation to subordinate agents."""
+    print("Testing delegation...")
+    
+    a0mini = load_a0mini()
+    if a0mini is None:
+        return
+    
+    import asyncio
+    import time
+    import agents
+    from openai.types.responses import ResponseOutputMessage, ResponseOutputText
+    
+    class SlowModel(agents.Model):
+        """Model that answers after a fixed delay without any network."""
+        
+        async def get_response(self, system_instructions, input, *args, **kwargs):
+            await asyncio.sleep(0.2)
+            text = ResponseOutputText(type="output_text", text="done", annotations=[])
+            message = ResponseOutputMessage(id="msg", type="message", role="assistant", status="completed", content=[text])
+            return agents.ModelResponse(output=[message], usage=agents.Usage(), response_id=None)
+        
+        def stream_response(self, *args, **kwargs):
+            raise NotImplementedError
+    
+    async def run(max_concurrency):
+        agent = agents.Agent(name="test", model=SlowModel())
+        context = a0mini.AgentContext(agent=agent, max_concurrency=max_concurrency, log_writer=a0mini.LogWriter(echo=False))
+        start = time.perf_counter()
+        results = await context.delegate_many(["a", "b", "c"])
+        return results, time.perf_counter() - start, context
+    
+    agents.set_tracing_disabled(True)
+    results, elapsed, context = asyncio.run(run(3))
+    assert results == ["done", "done", "done"], "Should gather subordinate results"
+    assert context.subordinates == [] and context.subordinate_count == 3, "Should drop subordinates once their tasks are over"
+    assert elapsed < 0.5, f"Subtasks should run concurrently, took {elapsed:.2f}s"
+    _, elapsed, _ = asyncio.run(run(1))
+    assert elapsed >= 0.6, f"Should respect the concurrency limit, took {elapsed:.2f}s"
+    
+    async def cancel():
+        agent = agents.Agent(name="test", model=SlowModel())
+        context = a0mini.AgentContext(agent=agent, log_writer=a0mini.LogWriter(echo=False))
+        parent = asyncio.create_task(context.delegate_many(["a", "b"]))
+        await asyncio.sleep(0.05)
+        children = list(context.tasks)
+        parent.cancel()
+        await asyncio.gather(parent, return_exceptions=True)
+        return children
+    
+    children = asyncio.run(cancel())
+    assert children and all(child.cancelled() for child in children), "Cancellation should reach subordinates"
+    
+    class FlakyModel(SlowModel):
+        """Model that fails the task named `b`."""
+        
+        async def get_response(self, system_instructions, input, *args, **kwargs):
+            if "Task: b" in str(input):
+                raise RuntimeError("model failed")
+            return await super().get_response(system_instructions, input, *args, **kwargs)
+    
+    async def partial():
+        from agents.tool_context import ToolContext
+        agent = agents.Agent(name="test", model=FlakyModel())
+        context = a0mini.AgentContext(agent=agent, log_writer=a0mini.LogWriter(echo=False))
+        results = await context.delegate_many(["a", "b", "c"])
+        output = await a0mini.delegate_tasks.on_invoke_tool(ToolContext(context, tool_name="delegate_tasks", tool_call_id="1", tool_arguments=""), '{"task_descriptions": ["a", "b"]}')
+        return results, output, context
+    
+    results, output, context = asyncio.run(partial())
+    assert results[0] == results[2] == "done" and isinstance(results[1], RuntimeError), f"Should keep the results of the tasks that succeeded, got {results}"
+    assert "Task: a\nResult: done" in output and "Task: b\nError: RuntimeError('model failed')" in output, f"Should report errors per task, got {output}"
+    assert context.subordinates == [] and context.create_subordinate().agent_id == "0.5", "Should keep subordinate ids unique"
+    
+    class CountingModel(SlowModel):
+        """Model that records how many responses are in flight."""
+        
+        running, peak = 0, 0
+        
+        async def get_response(self, *args, **kwargs):
+            CountingModel.running += 1
+            CountingModel.peak = max(CountingModel.peak, CountingModel.running)
+            try:
+                return await super().get_response(*args, **kwargs)
+            finally:
+                CountingModel.running -= 1
+    
+    async def parallel_delegations():
+        agent = agents.Agent(name="test", model=CountingModel())
+        context = a0mini.AgentContext(agent=agent, max_concurrency=1, log_writer=a0mini.LogWriter(echo=False))
+        # Stand in for a running agent making two delegation tool calls in one turn
+        async with context.semaphore:
+            context.running = True
+            results = await asyncio.gather(context.delegate_many(["a"]), context.delegate("b"))
+            context.running = False
+        return results, context
+    
+    results, context = asyncio.run(parallel_delegations())
+    assert results == [["done"], "done"] and CountingModel.peak == 1, f"Should not exceed max_concurrency, peak was {CountingModel.peak}"
+    assert not context.semaphore.locked() and context.semaphore._value == 1, "Should give the slot back exactly once"
+    
+    print("✓ Delegation tests passed")
+
+
+def test_python_worker_pool():
+    """Test warm Python workers used by execute_code."""
+    print("Testing PythonWorkerPool...")
+    
+    a0mini = load_a0mini()
+    if a0mini is None:
+        return
+    
+    pool = a0mini.PythonWorkerPool(size=1, preload=("json",), max_runs=2, timeout=5)
+    try:
+        assert pool.run("x = 21\nprint(x * 2)") == "42\n", "Should run code and capture output"
+        assert "NameError" in pool.run("print(x)"), "Each snippet should get a fresh namespace"
+        assert pool.run("import sys; print('json' in sys.modules)") == "True\n", "Should preload modules"
+        code = "import os, subprocess, sys\nprint('a')\nos.system('echo b')\nsubprocess.run([sys.executable, '-c', 'print(1 / 0)'])"
+        output = pool.run(code)
+        assert output.startswith("a\nb\n") and "ZeroDivisionError" in output, f"Should capture output written by subprocesses, got {output!r}"
+        assert pool.run("import time; time.sleep(10)", timeout=0.5) == "Error: Code execution timeout", "Should time out"
+        assert pool.run("print('recovered')") == "recovered\n", "Should replace a hung worker"
+    finally:
+        pool.close()
+    
+    print("✓ Python worker pool tests passed")
+
+
 def test_execute_code_tool():
     """Test the execute_code tool function."""
     print("Testing execute_code functionality...")
@@ -85,6 +446,731 @@ def test_terminal_command_tool():
     print("✓ Terminal command tests passed")
 
 
+def test_shell_session():
+    """Test the persistent shell behind terminal_command."""
+    print("Testing ShellSession...")
+    
+    import time
+    import terminal
+    if not terminal.ShellSession.available():
+        print("⚠ Skipped: bash not available")
+        return
+    
+    shell = terminal.ShellSession(timeout=5)
+    try:
+        shell.run("cd / && export SESSION_TEST=kept")
+        result = shell.run("pwd; echo $SESSION_TEST; echo oops >&2; false")
+        assert result.stdout == "/\nkept\n", "Should keep cwd and environment across commands"
+        assert (result.returncode, result.stderr) == (1, "oops\n"), "Should report exit code and stderr"
+        try:
+            shell.run("sleep 10", timeout=0.5)
+            assert False, "Should time out"
+        except subprocess.TimeoutExpired:
+            pass
+        assert shell.run("echo restarted").stdout == "restarted\n", "Should restart after a hang"
+        
+        shell.run("cd / && export SESSION_TEST=kept")
+        start = time.time()
+        for command in ("echo hi; fi", 'echo "foo', "cat <<EOF\nabc"):
+            result = shell.run(command)
+            assert "syntax error" in result.stderr or "unexpected EOF" in result.stderr or "end-of-file" in result.stderr, f"Should report the error of {command!r}"
+        assert shell.run("pwd; echo $SESSION_TEST").stdout == "/\nkept\n", "Syntax errors should not reset the shell"
+        assert shell.run("exit 3").returncode == 3, "Should report the exit code of a command that ends the shell"
+        assert shell.run("echo again").stdout == "again\n", "Should restart after the shell exits"
+        assert time.time() - start < 2, "Should not wait for the timeout when the shell exits or a command does not parse"
+    finally:
+        shell.close()
+    
+    print("✓ Shell session tests passed")
+
+
+def test_output_capture():
+    """Test size-capped capture of tool output."""
+    print("Testing capped output capture...")
+    
+    import terminal
+    
+    result = terminal.run([sys.executable, "-c", "print('x' * 100000, end=''); print('done')"], limit=1000)
+    assert result.stdout.startswith("x" * 500), "Should keep the head of the output"
+    assert result.stdout.endswith("x" * 495 + "done\n"), "Should keep the tail of the output"
+    assert "[... 99005 bytes truncated ...]" in result.stdout, "Should report the dropped bytes"
+    assert terminal.truncate("short", limit=1000) == "short", "Should not change short output"
+    
+    if terminal.ShellSession.available():
+        import time
+        start = time.time()
+        result = terminal.run("sleep 5 & echo hi", shell=True, timeout=1)
+        assert result.stdout == "hi\n" and time.time() - start < 2, "Should not wait past the timeout for background children holding the pipes"
+    
+    if terminal.ShellSession.available():
+        shell = terminal.ShellSession(limit=1000)
+        try:
+            result = shell.run("seq 1 100000")
+            assert "bytes truncated" in result.stdout and result.stdout.endswith("100000\n"), "Should cap shell output"
+            assert result.returncode == 0, "Should still detect the end of a truncated command"
+        finally:
+            shell.close()
+    
+    print("✓ Output capture tests passed")
+
+
+def test_history_compaction():
+    """Test that conversation history stays within its token budget."""
+    print("Testing history compaction...")
+    
+    import history
+    
+    calls = []
+    def summarizer(summary, messages, limit):
+        calls.append(len(messages))
+        return history.summarize(summary, messages, limit)
+    
+    messages = history.History(budget=200, keep=2, summarizer=summarizer)
+    for turn in range(50):
+        messages.append("user", f"question {turn} " + "x" * 200)
+        messages.append("assistant", f"answer {turn} " + "y" * 200)
+    
+    sent = messages.messages()
+    assert messages.tokens <= 200 and len(messages) >= 2, "Should keep the recent turns within the budget"
+    assert sent[-1]["content"].startswith("answer 49"), "Should keep the latest turn verbatim"
+    assert sent[0]["role"] == "system" and "question 48" in sent[0]["content"], "Should lead with the summary"
+    assert sum(calls) == 100 - len(messages), "Should summarize each dropped turn exactly once"
+    assert "question 0" not in sent[0]["content"] and len(sent[0]["content"]) < 100 * 4, "Should cap the summary size"
+    assert messages.messages()[0] is sent[0], "Should reuse the cached summary between compactions"
+    
+    print("✓ History compaction tests passed")
+
+
+def test_metrics():
+    """Test per-turn, per-model-call and per-tool metrics."""
+    print("Testing metrics...")
+    
+    try:
+        import agents
+        import metrics
+        from openai.types.responses import Response, ResponseCompletedEvent, ResponseFunctionToolCall, ResponseOutputMessage, ResponseOutputText, ResponseTextDeltaEvent
+    except ImportError as e:
+        print(f"⚠ Skipped metrics tests (missing dependency: {e})")
+        return
+    
+    import asyncio
+    import json
+    import os
+    import tempfile
+    
+    class ToolModel(agents.Model):
+        """Model that calls the `wait` tool once, then answers."""
+        
+        def __init__(self):
+            self.calls = 0
+        
+        def output(self):
+            self.calls += 1
+            if self.calls == 1:
+                return [ResponseFunctionToolCall(type="function_call", id="fc", call_id="call", name="wait", arguments="{}")]
+            text = ResponseOutputText(type="output_text", text="done", annotations=[])
+            return [ResponseOutputMessage(id="msg", type="message", role="assistant", status="completed", content=[text])]
+        
+        async def get_response(self, *args, **kwargs):
+            return agents.ModelResponse(output=self.output(), usage=agents.Usage(requests=1, input_tokens=10, output_tokens=2), response_id=None)
+        
+        async def stream_response(self, *args, **kwargs):
+            output = self.output()
+            await asyncio.sleep(0.05)
+            yield ResponseTextDeltaEvent(type="response.output_text.delta", delta="done", content_index=0, item_id="msg", output_index=0, sequence_number=0, logprobs=[])
+            response = Response(id="response", created_at=0, model="test", object="response", output=output, parallel_tool_calls=False, tool_choice="auto", tools=[])
+            yield ResponseCompletedEvent(type="response.completed", response=response, sequence_number=1)
+    
+    @agents.function_tool
+    async def wait() -> str:
+        await asyncio.sleep(0.1)
+        return "waited"
+    
+    async def run(recorder):
+        await agents.Runner.run(agents.Agent(name="test", model=ToolModel(), tools=[wait]), "go", hooks=recorder)
+        stream = agents.Runner.run_streamed(agents.Agent(name="test", model=ToolModel(), tools=[wait]), "go", hooks=recorder)
+        return [event async for event in recorder.stream(stream)]
+    
+    agents.set_tracing_disabled(True)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "metrics.jsonl")
+        recorder = metrics.Recorder(path, summary=False)
+        events = asyncio.run(run(recorder))
+        assert events, "Should pass the stream events through"
+        table = recorder.summary()
+        recorder.close()
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+    
+    tools = [r for r in records if r["kind"] == "tool"]
+    assert len(tools) == 2 and all(r["name"] == "wait" and r["seconds"] >= 0.1 for r in tools), "Should time each tool call"
+    assert len([r for r in records if r["kind"] == "llm"]) == 4, "Should record each model call"
+    assert records[0]["input_tokens"] == 10 and records[0]["output_tokens"] == 2, "Should record token usage"
+    turn = records[-1]
+    assert turn["kind"] == "turn" and 0.05 <= turn["ttft"] < turn["seconds"], "Should record time to first token"
+    assert "tool:wait" in table and "turn:test" in table, "Should summarize the totals"
+    assert not metrics.Recorder().enabled, "Should record nothing without a path"
+    
+    print("✓ Metrics tests passed")
+
+
+def test_record_replay():
+    """Test recording chat completions and replaying them offline."""
+    print("Testing record and replay...")
+    
+    a0mini = load_a0mini()
+    if a0mini is None:
+        return
+    
+    import asyncio
+    import os
+    import tempfile
+    import agents
+    import replay
+    
+    async def run(server, cassette=None):
+        async with a0mini.AgentZeroMini(api_key="replay", base_url=server.base_url, log_writer=a0mini.LogWriter(echo=False)) as zero:
+            if cassette:
+                replay.record(zero.client, cassette)
+            zero.agent = zero.agent.clone(tools=[tool for tool in zero.tools if isinstance(tool, agents.FunctionTool)])
+            return await zero.run("remember the fact"), len(zero.context.memory.memories)
+    
+    agents.set_tracing_disabled(True)
+    entries = [replay.tool_call("store_memory", {"content": "fact"}), replay.text(["Stored", " it."])]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cassette = os.path.join(tmpdir, "cassette.jsonl")
+        with replay.ReplayServer(entries) as server:
+            assert asyncio.run(run(server, cassette)) == ("Stored it.", 1), "Should run the tool and stream the answer"
+        recorded = replay.load(cassette)
+        assert len(recorded) == 2 and recorded[1]["request"]["messages"][-1]["role"] == "tool", "Should record each request and response"
+        with replay.ReplayServer(cassette, latency=0.05, token_latency=0.01) as server:
+            assert asyncio.run(run(server)) == ("Stored it.", 1), "Should replay the recorded conversation"
+            assert server.requests == 2 and server.connections == 1, "Should serve over one pooled connection"
+    
+    print("✓ Record and replay tests passed")
+
+
+def test_tool_cache():
+    """Test caching of deterministic tool results."""
+    print("Testing ToolCache...")
+    
+    import os
+    import tempfile
+    import toolcache
+    
+    assert toolcache.read_only("grep -rn foo . | head -5"), "Should accept read-only pipelines"
+    assert toolcache.read_only(["bash", "-lc", "sed -n 1,5p a.py"]), "Should look inside bash -lc"
+    assert not any(toolcache.read_only(command) for command in ("rm x", "cat a > b", "sed -i s/a/b/ x", "find . -delete", "ls; rm x")), "Should reject commands that may write"
+    assert not any(toolcache.read_only(command) for command in ("sed -n 1w out a.py", "sed -n 1e a.py", "sed -n 's/a/b/w out' a.py", "sed -ni 1p a.py")), "Should reject sed scripts that write files or run commands"
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "a.txt")
+        with open(path, "w") as f:
+            f.write("one")
+        cache = toolcache.ToolCache(capacity=2)
+        cache.put(("view", path), "one", [path])
+        cache.put(("view", tmpdir), ["./a.txt"], [tmpdir])
+        assert cache.get(("view", path)) == "one", "Should hit while the file is unchanged"
+        with open(path, "w") as f:
+            f.write("changed")
+        assert cache.get(("view", path)) is None, "Should miss once the file changes"
+        cache.invalidate(path)
+        assert cache.get(("view", tmpdir)) is None, "Writing a file should drop the listing of its folder"
+        
+        cache.put(("bash", "ls"), "a.txt", command=True)
+        assert cache.get(("bash", "ls")) == "a.txt", "Should hit for repeated read-only commands"
+        cache.invalidate_commands()
+        assert cache.get(("bash", "ls")) is None, "Should drop command output after a write"
+        
+        sources = toolcache.sources("cat a.txt", tmpdir)
+        assert sources == [path], f"Should read the source files of a command, got {sources}"
+        assert toolcache.sources("grep -rn foo .", tmpdir) is None, "Should not track recursive reads"
+        cache.put(("bash", "cat a.txt"), "changed", sources, command=True)
+        with open(path, "w") as f:
+            f.write("changed again")
+        assert cache.get(("bash", "cat a.txt")) is None, "Should miss once a file a command read changes elsewhere"
+        
+        for name in "abc":
+            cache.put(("bash", name), name, command=True)
+        assert cache.get(("bash", "a")) is None and len(cache.entries) == 2, "Should evict the least recently used entry"
+        
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["invalidations"]) == (2, 5, 1), f"Should count hits and misses, got {stats}"
+        assert toolcache.ToolCache(0).put("key", "value") == "value" and toolcache.ToolCache(0).get("key") is None, "Capacity 0 should disable the cache"
+    
+    print("✓ ToolCache tests passed")
+
+
+def test_parallel_tools():
+    """Test that offloaded tools overlap up to the per-agent limit."""
+    print("Testing parallel tools...")
+    
+    import asyncio
+    import threading
+    import time
+    import terminal
+    
+    running, peak, lock = [0], [0], threading.Lock()
+    
+    def work(seconds: float) -> float:
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(seconds)
+        with lock:
+            running[0] -= 1
+        return seconds
+    
+    async def gather(slots):
+        tool = terminal.offload(slots)(work)
+        assert asyncio.iscoroutinefunction(tool) and tool.__doc__ == work.__doc__
+        start = time.perf_counter()
+        results = await asyncio.gather(*(tool(0.1) for _ in range(4)))
+        return results, time.perf_counter() - start
+    
+    results, elapsed = asyncio.run(gather(asyncio.Semaphore(2)))
+    assert results == [0.1] * 4 and peak[0] == 2, f"Should run two calls at once, peak was {peak[0]}"
+    assert elapsed < 0.35, f"Calls should overlap, took {elapsed:.2f}s"
+    
+    a0mini = load_a0mini()
+    if a0mini is None:
+        return
+    from agents.tool_context import ToolContext
+    
+    async def invoke():
+        context = a0mini.AgentContext(log_writer=a0mini.LogWriter(echo=False), max_parallel_tools=3)
+        subordinate = context.create_subordinate()
+        assert subordinate.max_parallel_tools == 3 and subordinate.tool_slots is not context.tool_slots, "Subordinates should get their own slots"
+        calls = [
+            a0mini.execute_code.on_invoke_tool(ToolContext(context, tool_name="execute_code", tool_call_id=str(number), tool_arguments=""), f'{{"language": "bash", "code": "echo {number}"}}')
+            for number in range(3)
+        ]
+        return await asyncio.gather(*calls)
+    
+    assert [output.strip() for output in asyncio.run(invoke())] == ["0", "1", "2"], "Should run execute_code calls concurrently"
+    
+    print("✓ Parallel tools tests passed")
+
+
+def test_directory_listing():
+    """Test the pruned, .gitignore aware directory listing."""
+    print("Testing directory listing...")
+    
+    import os
+    import tempfile
+    import editor
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for path in ("README.md", "src/app.py", "src/app.pyc", "src/pkg/deep/module.py", "node_modules/lib/index.js", ".git/HEAD", "build/out.o", "src/build/x.py", "docs/keep.log"):
+            os.makedirs(os.path.join(tmpdir, os.path.dirname(path)), exist_ok=True)
+            open(os.path.join(tmpdir, path), "w").close()
+        with open(os.path.join(tmpdir, ".gitignore"), "w") as f:
+            f.write("node_modules/\n/build/\n*.pyc\n*.log\n!docs/keep.log\n")
+        
+        cache = editor.DirectoryCache()
+        result, sources = editor.list_directory(tmpdir, cache=cache)
+        expected = ["./.gitignore", "./README.md", "./docs/", "./docs/keep.log", "./src/", "./src/app.py", "./src/build/", "./src/pkg/"]
+        assert result == expected, f"Should prune ignored, hidden and deep entries, got {result}"
+        assert "./src/build/x.py" in editor.list_directory(tmpdir, depth=3, cache=cache)[0], "A leading slash should anchor the rule to the .gitignore folder"
+        assert os.path.join(tmpdir, "src", "pkg") not in sources, "Should not open folders at the depth limit"
+        
+        root = cache.entries[tmpdir][1]
+        open(os.path.join(tmpdir, "src", "new.py"), "w").close()
+        result, _ = editor.list_directory(tmpdir, cache=cache)
+        assert "./src/new.py" in result, "Should rescan changed folders"
+        assert cache.entries[tmpdir][1] is root, "Should reuse unchanged folders"
+        
+        result, _ = editor.list_directory(tmpdir, limit=3, cache=cache)
+        assert len(result) == 4 and result[-1].startswith("<response clipped>"), "Should cap the number of entries"
+    
+    print("✓ Directory listing tests passed")
+
+
+def test_line_index():
+    """Test line range reads through the memory-mapped line index."""
+    print("Testing LineIndex...")
+    
+    import os
+    import tempfile
+    import threading
+    import editor
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "big.txt")
+        for text in ("", "one", "one\ntwo\n", "é\r\nñ\r\nend", "\n".join(f"line {i}" for i in range(10000))):
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.write(text)
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().split("\n")
+            index = editor.LineIndex(path, chunk_size=64)
+            assert index.read() == "\n".join(lines), "Should read the whole file"
+            for first, last in ((1, 1), (1, len(lines)), (len(lines), len(lines)), (len(lines) // 2 + 1, len(lines))):
+                assert index.read(first, last) == "\n".join(lines[first - 1 : last]), f"Should read lines {first} to {last}"
+            assert index.line_count() == len(lines) and not index.has_line(len(lines) + 1), "Should count lines like str.split"
+            index.close()
+        
+        index = editor.LineIndex(path, chunk_size=64)
+        assert index.read(5, 6) == "line 4\nline 5" and index.scanned < index.size, "Should only index as far as needed"
+        assert index.read(1, limit=10) == "line 0\nlin", "Should stop reading at the limit"
+        index.close()
+        
+        with editor.line_index(path) as first, editor.line_index(path) as second:
+            assert first is second and first.users == 2, "Should cache the index"
+        assert first.data.closed, "Should unmap the file between uses"
+        with editor.line_index(path) as index:
+            assert index is first and index.read(2, 2) == "line 1", "Should map the file again for the next use"
+        with editor.line_index(path) as index:
+            # Replace the file as the editor does, truncating a mapped file in place is not safe
+            with open(path + ".new", "w", encoding="utf-8") as f:
+                f.write("changed\n")
+            os.replace(path + ".new", path)
+            with editor.line_index(path) as changed:
+                assert changed.read(1, 1) == "changed", "Should rebuild the index when the file changes"
+            assert index.read(1, 1) == "line 0" and not index.data.closed, "Should keep a replaced index open while it is in use"
+        assert index.data.closed, "Should close a replaced index after its last use"
+        editor.line_indexes.pop(os.path.abspath(path)).close()
+        
+        # Threads evicting and rebuilding indexes of a small cache must not close one another's maps
+        paths = [os.path.join(tmpdir, f"{number}.txt") for number in range(8)]
+        for number, name in enumerate(paths):
+            with open(name, "w", encoding="utf-8") as f:
+                f.write("\n".join(f"{number} {i}" for i in range(2000)))
+        errors = []
+        
+        def read(offset):
+            try:
+                for step in range(200):
+                    number = (offset + step) % len(paths)
+                    with editor.line_index(paths[number], capacity=2) as index:
+                        assert index.read(1500, 1500) == f"{number} 1499"
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=read, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors, f"Should read safely from several threads, got {errors[:3]}"
+        for name in paths:
+            index = editor.line_indexes.pop(os.path.abspath(name), None)
+            if index is not None:
+                index.close()
+    
+    print("✓ LineIndex tests passed")
+
+
+def test_file_editing():
+    """Test str_replace and insert through the editing engine."""
+    print("Testing file editing...")
+    
+    import os
+    import tempfile
+    import editor
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "code.py")
+        with open(path, "w") as f:
+            f.write("\n".join(f"line {i}" for i in range(1, 21)) + "\n")
+        os.chmod(path, 0o755)
+        first, snippet = editor.replace(path, "line 10\n", "line ten\nline 10.5\n")
+        assert (first, snippet.split("\n")[0], snippet.split("\n")[-1]) == (6, "line 6", "line 15"), "Should show 4 lines of context"
+        with open(path) as f:
+            assert "line 9\nline ten\nline 10.5\nline 11\n" in f.read(), "Should replace the match"
+        assert os.stat(path).st_mode & 0o777 == 0o755 and os.listdir(tmpdir) == ["code.py"], "Should keep the mode and leave no temporary file"
+        for old in ("missing", "line 1"):
+            try:
+                editor.replace(path, old, "x")
+                assert False, "Should reject missing and repeated matches"
+            except ValueError as e:
+                assert "No replacement was performed" in str(e)
+        
+        with open(path, "w", newline="") as f:
+            f.write("def f():\r\n\tif x:\r\n\t\treturn 1\r\n")
+        editor.replace(path, "\t\treturn 1", "\t\treturn 2")
+        editor.replace(path, " " * 16 + "return 2", " " * 16 + "return 3")
+        first, snippet = editor.insert(path, 1, "\t# check")
+        with open(path, newline="") as f:
+            assert f.read() == "def f():\r\n\t# check\r\n\tif x:\r\n" + " " * 16 + "return 3\r\n", "Should keep tabs outside edited lines and line breaks"
+        assert (first, snippet) == (1, "def f():\n\t# check\n\tif x:\n" + " " * 16 + "return 3\n"), "Should show the inserted lines in context"
+        
+        editor.insert(path, 5, "end")
+        with open(path, newline="") as f:
+            assert f.read().endswith("return 3\r\n\r\nend"), "Should append after the last line"
+        try:
+            editor.insert(path, 7, "x")
+            assert False, "Should reject lines past the end"
+        except ValueError as e:
+            assert "[0, 6]" in str(e)
+        
+        # Concurrent edits of one file must not overwrite each other
+        from concurrent.futures import ThreadPoolExecutor
+        shared = os.path.join(tmpdir, "shared.py")
+        with open(shared, "w") as f:
+            f.write("".join(f"value_{number} = 0\n" for number in range(20)))
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda number: editor.replace(shared, f"value_{number} = 0\n", f"value_{number} = 1\n"), range(10)))
+            list(pool.map(lambda number: editor.insert(shared, 0, f"# {number}"), range(5)))
+            patches = [f"*** Begin Patch\n*** Update File: {shared}\n-value_{number} = 0\n+value_{number} = 2\n*** End Patch" for number in range(10, 20)]
+            list(pool.map(editor.apply_patch, patches))
+        with open(shared) as f:
+            content = f.read()
+        assert content.count("= 1\n") == 10 and content.count("= 2\n") == 10 and content.count("# ") == 5, f"Should serialize edits of one file, got {content!r}"
+        
+        # Windows refuses to replace a mapped file, so no map of it may be open by then
+        if os.path.exists("/proc/self/maps"):
+            replace = os.replace
+            
+            def unmapped(source, target):
+                with open("/proc/self/maps") as f:
+                    assert target not in f.read(), f"Should unmap {target} before replacing it"
+                replace(source, target)
+            
+            os.replace = unmapped
+            try:
+                editor.replace(path, "\tif x:", "\tif y:")
+                editor.replace(path, "    if y:", "    if z:")
+                editor.insert(path, 2, "pass")
+            finally:
+                os.replace = replace
+    
+    print("✓ File editing tests passed")
+
+
+def test_patch_engine():
+    """Test that patches apply hunks through the line index and to all files or none."""
+    print("Testing patch engine...")
+    
+    import os
+    import tempfile
+    import editor
+    
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        try:
+            with open("a.py", "w", newline="") as f:
+                f.write("def f():\r\n    return 1\r\n\r\ndef g():\r\n    return 2\r\n")
+            with open("b.py", "w") as f:
+                f.write("x = 1\n")
+            patch = "\n".join([
+                "*** Begin Patch",
+                "*** Update File: a.py",
+                "@@ def g():",
+                "-    return 2",
+                "+    return 3",
+                "*** Add File: pkg/c.py",
+                "+y = 2",
+                "*** Update File: b.py",
+                "-x = 2",
+                "+x = 3",
+                "*** End Patch"
+            ])
+            try:
+                editor.apply_patch(patch)
+                assert False, "Should reject a hunk whose context is missing"
+            except ValueError as e:
+                assert "b.py: Deletion mismatch at line 1" in str(e)
+            with open("a.py", newline="") as f:
+                assert f.read().endswith("return 2\r\n"), "Should leave earlier files untouched"
+            assert sorted(os.listdir(".")) == ["a.py", "b.py"], "Should remove added files and temporary files"
+            
+            paths = editor.apply_patch(patch.replace("-x = 2", "-x = 1").replace("*** End Patch", "*** Delete File: pkg/c.py\n*** End Patch"))
+            assert paths == ["a.py", "pkg/c.py", "b.py", "pkg/c.py"]
+            with open("a.py", newline="") as f:
+                assert f.read() == "def f():\r\n    return 1\r\n\r\ndef g():\r\n    return 3\r\n", "Should find the hunk after the anchor and keep line breaks"
+            with open("b.py") as f:
+                assert f.read() == "x = 3\n"
+            assert not os.path.exists("pkg/c.py"), "Should apply operations on one file in order"
+            
+            with open("b.py", "w") as f:
+                f.write("x = 1\ny = 2\n\nz = 3\n")
+            editor.apply_patch("*** Begin Patch\n*** Update File: b.py\n x = 1\n-y = 2\n+y = 20\n\n*** End Patch")
+            with open("b.py") as f:
+                assert f.read() == "x = 1\ny = 20\n\nz = 3\n", "Should ignore a trailing blank line"
+            lines = ["x = 1", "y = 20", "", "z = 3", ""]
+            assert editor.update_lines("b.py", lines, ["-y = 20", "", " z = 3"]) == ["x = 1", "", "z = 3", ""], "Should keep blank lines inside a hunk as context"
+            try:
+                editor.update_lines("b.py", lines, [" y = 20", "", "-z = 4"])
+                assert False, "Should reject a hunk that does not match"
+            except ValueError as e:
+                assert "Deletion mismatch at line 4: expected 'z = 4', found 'z = 3'" in str(e), f"Should report where the hunk nearly matched, got {e}"
+        finally:
+            os.chdir(cwd)
+    
+    print("✓ Patch engine tests passed")
+
+
+def test_screenshot_pipeline():
+    """Test downscaling, coordinate mapping, encoding and frame reuse of screenshots."""
+    print("Testing screenshot pipeline...")
+    
+    try:
+        from PIL import Image, ImageDraw
+        import screen
+    except ImportError as e:
+        print(f"⚠ Skipped screenshot tests (missing dependency: {e})")
+        return
+    
+    import base64
+    
+    frame = Image.new("RGB", (3840, 2160), "white")
+    ImageDraw.Draw(frame).rectangle((100, 100, 1900, 1000), fill="navy")
+    frames = [frame]
+    shots = screen.Screen((1920, 1080), capture=lambda: frames[-1], width=1280)
+    assert shots.dimensions == (1280, 720), f"Should downscale to the width limit, got {shots.dimensions}"
+    assert shots.point(640, 360) == (960, 540) and shots.point(0, 0) == (0, 0), "Should map points back to logical screen coordinates"
+    
+    first = shots.screenshot()
+    assert base64.b64decode(first).startswith(b"\x89PNG"), "Should encode PNG by default"
+    assert shots.screenshot() is first and shots.reused == 1, "Should reuse an unchanged frame"
+    changed = frame.copy()
+    ImageDraw.Draw(changed).text((3000, 1500), "x", fill="black")
+    frames.append(changed)
+    assert shots.screenshot() != first and shots.reused == 1, "Should notice a single character"
+    
+    lossy = screen.Screen((3840, 2160), capture=lambda: frame, width=0, format="jpeg", quality=60)
+    data = base64.b64decode(lossy.screenshot())
+    assert lossy.dimensions == (3840, 2160) and data.startswith(b"\xff\xd8"), "Width 0 should keep the resolution"
+    
+    print("✓ Screenshot pipeline tests passed")
+
+
+def test_virtual_computer():
+    """Test scripted computer-use sessions on in-memory displays, side by side."""
+    print("Testing virtual computer...")
+    
+    try:
+        import agents
+        import display
+    except ImportError as e:
+        print(f"⚠ Skipped virtual computer tests (missing dependency: {e})")
+        return
+    
+    import asyncio
+    
+    async def session(steps, width, script=display.SCRIPT):
+        computer = display.VirtualComputer(width=width)
+        agent = agents.Agent(name="computer-use", model=display.ScriptedModel(steps, script), tools=[agents.ComputerTool(computer)])
+        result = await agents.Runner.run(agent, "go", max_turns=steps + 1)
+        return computer, result.final_output
+    
+    async def sessions():
+        script = [{"type": "click", "x": 320, "y": 180, "button": "left"}, {"type": "type", "text": "hi"}]
+        return await asyncio.gather(session(2, 640, script), session(len(display.SCRIPT), 0))
+    
+    agents.set_tracing_disabled(True)
+    (small, answer), (full, _) = asyncio.run(sessions())
+    assert answer == "Done.", "Should answer after the scripted steps"
+    assert small.dimensions == (640, 360) and small.actions == [("click", 640, 360, "left"), ("screenshot",), ("type", "hi"), ("screenshot",)], "Should map clicks from the downscaled frame"
+    assert full.dimensions == (1280, 720) and len(full.actions) == 2 * len(display.SCRIPT), "Should run every scripted action"
+    assert small.lines == ["hi"] and full.lines == ["hello world"], "Sessions should not share state"
+    
+    print("✓ Virtual computer tests passed")
+
+
+def test_search_scheduler():
+    """Test the bounded, retrying and hedging scheduler of research.py."""
+    print("Testing search scheduler...")
+    
+    try:
+        import research
+    except ImportError as e:
+        print(f"⚠ Skipped search scheduler tests (missing dependency: {e})")
+        return
+    
+    import asyncio
+    
+    async def run():
+        scheduler = research.Scheduler(concurrency=2, timeout=0.5, retries=1, backoff=0.01, hedge=0.1, deadline=2)
+        running, peak, calls = [0], [0], {}
+        
+        async def search(query):
+            calls[query] = calls.get(query, 0) + 1
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            try:
+                if query == "flaky" and calls[query] == 1:
+                    raise ConnectionError("rate limited")
+                if query == "slow" and calls[query] == 1:
+                    await asyncio.sleep(0.4)
+                    return "late"
+                if query == "broken":
+                    raise ValueError("always fails")
+                await asyncio.sleep(0.02)
+                return query
+            finally:
+                running[0] -= 1
+        
+        results = await asyncio.gather(*(scheduler.call(search, query) for query in ["a", "flaky", "slow", "broken", "b"]))
+        return scheduler, results, peak[0], calls
+    
+    scheduler, results, peak, calls = asyncio.run(run())
+    assert results == ["a", "flaky", "slow", None, "b"], f"Should retry, hedge and degrade, got {results}"
+    assert peak <= 2, "Should bound concurrent attempts"
+    assert calls["flaky"] == 2 and calls["broken"] == 2, "Should retry failed calls once"
+    assert scheduler.hedges >= 1 and scheduler.failures == 1
+    
+    async def queued():
+        # Five rounds of searches: waiting for a slot must not count against the hedge delay or deadline
+        scheduler = research.Scheduler(concurrency=4, timeout=1, retries=0, hedge=0.08, deadline=0.15)
+        
+        async def search(query):
+            await asyncio.sleep(0.1)
+            return query
+        
+        return scheduler, await asyncio.gather(*(scheduler.call(search, number) for number in range(20)))
+    
+    scheduler, results = asyncio.run(queued())
+    assert results == list(range(20)), "Should not drop searches that waited for a slot"
+    assert (scheduler.hedges, scheduler.attempts) == (0, 20), "Should not hedge while every slot is taken"
+    
+    print("✓ Search scheduler tests passed")
+
+
+def test_search_deduplication():
+    """Test query deduplication and the persistent search cache of research.py."""
+    print("Testing search deduplication and cache...")
+    
+    try:
+        import research
+    except ImportError as e:
+        print(f"⚠ Skipped search cache tests (missing dependency: {e})")
+        return
+    
+    import os
+    import tempfile
+    import time
+    
+    queries = ["Python 3.13 release notes", "python 3.13: release notes!", "latest Python 3.13 release notes", "Rust async runtimes"]
+    searches = [research.SearchQuery(reason="r", query=query) for query in queries]
+    assert research.normalize(queries[0]) == research.normalize(queries[1]) == "python 3 13 release notes"
+    assert research.normalize("migrate from python to java") != research.normalize("Migrate from Java to Python"), "Should keep the word order in cache keys"
+    assert [item.query for item in research.deduplicate(searches)] == [queries[0], queries[3]], "Should drop exact and near duplicates"
+    assert len(research.deduplicate(searches, threshold=1.0)) == 3, "Should keep searches below the threshold"
+    reversed_searches = [research.SearchQuery(reason="r", query=query) for query in ("migrate from python to java", "migrate from java to python")]
+    assert len(research.deduplicate(reversed_searches)) == 2, "Should keep a query with the same words in another order"
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "searches.db")
+        cache = research.SearchCache(path, capacity=2)
+        cache.put(queries[0], "summary 0")
+        cache.put(queries[3], "summary 3")
+        cache.close()
+        cache = research.SearchCache(path, capacity=2)
+        assert cache.get(queries[1]) == "summary 0" and cache.hits == 1, "Should hit by normalized query across runs"
+        assert cache.get("Release notes Python 3.13") is None, "Should miss for the same words in another order"
+        cache.put("Go generics", "summary go")
+        assert cache.get(queries[3]) is None and cache.get("go generics") == "summary go", "Should evict the least recently used entry"
+        cache.ttl = 0
+        time.sleep(0.01)
+        assert cache.get(queries[0]) is None, "Should expire old entries"
+        cache.close()
+    assert research.SearchCache().get(queries[0]) is None, "Should cache nothing without a path"
+    
+    print("✓ Search deduplication and cache tests passed")
+
+
 def test_syntax():
     """Test that a0mini.py has valid Python syntax."""
     print("Testing a0mini.py syntax...")
@@ -157,6 +1243,33 @@ def main():
         test_agent_context()
         print()
         
+        test_memory_search()
+        print()
+        
+        test_vector_memory_search()
+        print()
+        
+        test_memory_store()
+        print()
+        
+        test_memory_eviction()
+        print()
+        
+        test_recent_solutions()
+        print()
+        
+        test_log_writer()
+        print()
+        
+        test_pooled_client()
+        print()
+        
+        test_delegation()
+        print()
+        
+        test_python_worker_pool()
+        print()
+        
         test_agent_zero_mini_class()
         print()
         
@@ -166,6 +1279,51 @@ def main():
         test_terminal_command_tool()
         print()
         
+        test_shell_session()
+        print()
+        
+        test_output_capture()
+        print()
+        
+        test_history_compaction()
+        print()
+        
+        test_metrics()
+        print()
+        
+        test_record_replay()
+        print()
+        
+        test_tool_cache()
+        print()
+        
+        test_parallel_tools()
+        print()
+        
+        test_directory_listing()
+        print()
+        
+        test_line_index()
+        print()
+        
+        test_file_editing()
+        print()
+        
+        test_patch_engine()
+        print()
+        
+        test_screenshot_pipeline()
+        print()
+        
+        test_virtual_computer()
+        print()
+        
+        test_search_scheduler()
+        print()
+        
+        test_search_deduplication()
+        print()
+        
         print("=" * 60)
         print("✅ All basic tests passed!")
         print("=" * 60)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks of agent overhead for pytest-benchmark.
+Model responses are replayed by a local server, so no network or API key is needed.
+
+Run: python -m pytest test_bench_a0mini.py --benchmark-only
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+agents = pytest.importorskip("agents")
+
+import a0mini
+import history
+import replay
+
+
+@pytest.fixture(scope="module")
+def loop():
+    agents.set_tracing_disabled(True)
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def agent_zero(server):
+    zero = a0mini.AgentZeroMini(api_key="replay", base_url=server.base_url, log_writer=a0mini.LogWriter(echo=False))
+    # Hosted tools are not available through chat completions
+    zero.agent = zero.agent.clone(tools=[tool for tool in zero.tools if isinstance(tool, agents.FunctionTool)])
+    return zero
+
+
+def test_tool_turn(benchmark, loop):
+    """A turn that dispatches one tool call and streams a short answer."""
+    with replay.ReplayServer([replay.tool_call("store_memory", {"content": "fact"}), replay.text(["Stored", "."])]) as server:
+        zero = agent_zero(server)
+        benchmark(lambda: loop.run_until_complete(zero.run("remember this fact")))
+        loop.run_until_complete(zero.close())
+
+
+def test_streaming_turn(benchmark, loop):
+    """A turn that streams a long answer of 500 deltas."""
+    with replay.ReplayServer([replay.text(["token "] * 500)]) as server:
+        zero = agent_zero(server)
+        benchmark(lambda: loop.run_until_complete(zero.run("write a long answer")))
+        loop.run_until_complete(zero.close())
+
+
+@pytest.mark.parametrize("budget", [None, 4000])
+def test_long_history_turn(benchmark, loop, budget):
+    """A turn after 200 earlier turns, resent in full or compacted to a token budget."""
+    messages = history.History(budget or 10 ** 9)
+    for turn in range(200):
+        messages.append("user", f"question {turn} " + "words " * 100)
+        messages.append("assistant", f"answer {turn} " + "words " * 200)
+    with replay.ReplayServer([replay.text(["Done", "."])]) as server:
+        zero = agent_zero(server)
+
+        async def turn():
+            stream = agents.Runner.run_streamed(zero.agent, messages.messages() + [{"role": "user", "content": "next"}], context=zero.context)
+            async for _ in stream.stream_events():
+                pass
+
+        benchmark(lambda: loop.run_until_complete(turn()))
+        loop.run_until_complete(zero.close())
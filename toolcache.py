@@ -0,0 +1,245 @@
+import atexit
+import os
+import re
+import shlex
+import threading
+from collections import OrderedDict
+
+# Commands whose output depends only on the files they read
+READ_ONLY_COMMANDS = {"cat", "cut", "du", "file", "find", "grep", "head", "ls", "nl", "pwd", "rg", "sed", "sort", "stat", "tail", "tree", "uniq", "wc"}
+# Options that make an otherwise read-only command write or run other commands
+WRITE_OPTIONS = {
+    "find": ("-delete", "-exec", "-execdir", "-fprint", "-fprint0", "-fprintf", "-fls", "-ok", "-okdir"),
+    "sed": ("-i", "--in-place"),
+    "sort": ("-o", "--output"),
+    "tree": ("-o",),
+    "rg": ("--pre",)
+}
+# Commands that read whole folder trees, whose output no single stat can validate
+RECURSIVE_COMMANDS = {"du", "find", "rg", "tree"}
+# Short option letters and long options that make a command recurse into folders
+RECURSIVE_OPTIONS = {"grep": ("rR", ("--recursive", "--dereference-recursive")), "ls": ("R", ("--recursive",))}
+# A sed address, a line, `$`, `first~step` or a regex
+SED_ADDRESS = r"(?:\d+(?:~\d+)?|\$|/(?:[^/\\]|\\.)*/I?)"
+# Scripts that only select and print lines, so no `w` or `e` command or flag can write files or run commands
+SED_SCRIPT = re.compile(rf"\s*(?:{SED_ADDRESS}(?:\s*,\s*(?:{SED_ADDRESS}|\+\d+))?)?\s*!?\s*[pP=lqQ]?\s*")
+
+
+def pipeline(command) -> list:
+    """Split a shell command, as a string or an argument list, into the arguments of its pipeline, or None if it is not a plain pipeline."""
+    if not isinstance(command, str):
+        command = list(command)
+        # `bash -c "..."` and `bash -lc "..."` wrap the real command
+        if len(command) == 3 and command[0] in ("bash", "sh") and command[1] in ("-c", "-lc"):
+            command = command[2]
+        else:
+            command = shlex.join(command)
+    if any(char in command for char in ";&<>$`()\n"):
+        return None
+    try:
+        parts = [shlex.split(part) for part in command.split("|")]
+    except ValueError:
+        return None
+    return parts if all(parts) else None
+
+
+def has_option(args: list, letters: str, names: tuple) -> bool:
+    """Whether `args` holds one of the long options `names`, or one of the short option `letters`, alone or grouped."""
+    for arg in args[1:]:
+        if arg.startswith("--"):
+            if arg.split("=")[0] in names:
+                return True
+        elif arg.startswith("-") and any(letter in arg[1:] for letter in letters):
+            return True
+    return False
+
+
+def sed_read_only(args: list) -> bool:
+    """Whether a `sed` call runs with `-n` and only prints lines, checking every script it runs."""
+    scripts, quiet, expression = [], False, False
+    for arg in args[1:]:
+        if expression:
+            scripts.append(arg)
+            expression = False
+        elif arg in ("--quiet", "--silent"):
+            quiet = True
+        elif arg in ("-e", "--expression"):
+            expression = True
+        elif arg.startswith("--expression="):
+            scripts.append(arg.split("=", 1)[1])
+        elif arg in ("--regexp-extended", "--separate", "--null-data", "--unbuffered", "--posix"):
+            continue
+        elif arg.startswith("-") and arg != "-":
+            # Grouped short options, where a trailing `e` takes the next argument as a script
+            if not set(arg[1:-1]) <= set("nErsuz") or arg[-1] not in "nErsuze":
+                return False
+            quiet = quiet or "n" in arg
+            expression = arg[-1] == "e"
+        elif not scripts:
+            scripts.append(arg)
+    return quiet and bool(scripts) and all(SED_SCRIPT.fullmatch(script) for script in scripts)
+
+
+def read_only(command) -> bool:
+    """Whether a shell command, as a string or an argument list, only reads files."""
+    parts = pipeline(command)
+    if parts is None:
+        return False
+    for args in parts:
+        if args[0] not in READ_ONLY_COMMANDS:
+            return False
+        if any(arg.startswith(option) for arg in args[1:] for option in WRITE_OPTIONS.get(args[0], ())):
+            return False
+        if args[0] == "sed" and not sed_read_only(args):
+            return False
+    return True
+
+
+def sources(command, cwd: str = None) -> list:
+    """
+    Return the paths whose inode, size and modification time validate the
+    output of a read-only command: the arguments naming existing files or
+    folders, or the working directory `ls` lists by default. Returns None
+    when the output cannot be validated that way, for a folder searched
+    recursively, a relative path with `cwd` unknown or a command that reads
+    no file at all.
+    """
+    parts = pipeline(command)
+    if parts is None:
+        return None
+    paths = []
+    for number, args in enumerate(parts):
+        names = [arg for arg in args[1:] if not arg.startswith("-")]
+        if cwd is None and (any(not os.path.isabs(name) for name in names) or (number == 0 and not names)):
+            return None
+        found = [os.path.join(cwd or "", name) for name in names]
+        found = [path for path in found if os.path.lexists(path)]
+        if number == 0 and not found and args[0] in ("ls", "du", "find", "rg", "tree"):
+            found = [cwd]
+        if number == 0 and not found and args[0] != "pwd":
+            return None
+        letters, options = RECURSIVE_OPTIONS.get(args[0], ("", ()))
+        if (args[0] in RECURSIVE_COMMANDS or has_option(args, letters, options)) and any(os.path.isdir(path) for path in found):
+            return None
+        paths += found
+    return paths
+
+
+def signature(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class ToolCache:
+    """
+    LRU cache of deterministic tool results.
+
+    Entries for file views and directory listings record the inode, size and
+    modification time of the paths they were computed from and are dropped
+    when any of those change, or when `invalidate()` is called on one of the
+    paths or a directory containing it. Entries for read-only commands record
+    the paths from `sources()` the same way, so edits made elsewhere are
+    noticed, and are also dropped when `invalidate_commands()` is called,
+    which tools do after any command that may write. A capacity of 0 disables
+    the cache.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.dependents = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def get(self, key):
+        """Return the cached result for `key`, or None if it is missing or stale."""
+        if not self.enabled:
+            return None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                result, paths, generation = entry
+                if (generation is None or generation == self.generation) and all(signature(path) == stamp for path, stamp in paths):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                self.drop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, result, paths=(), command: bool = False):
+        """Cache `result` as computed from `paths`, or from the file system at large with `command`."""
+        if not self.enabled:
+            return result
+        paths = [os.path.abspath(path) for path in paths]
+        with self.lock:
+            self.drop(key)
+            self.entries[key] = (result, [(path, signature(path)) for path in paths], self.generation if command else None)
+            for path in paths:
+                self.dependents.setdefault(path, set()).add(key)
+            while len(self.entries) > self.capacity:
+                self.drop(next(iter(self.entries)))
+        return result
+
+    def drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            for path, _ in entry[1]:
+                keys = self.dependents.get(path)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.dependents[path]
+
+    def invalidate(self, path: str):
+        """Drop the entries computed from `path` or a directory containing it, and all command results."""
+        if not self.enabled:
+            return
+        path = os.path.abspath(path)
+        with self.lock:
+            while True:
+                for key in list(self.dependents.get(path, ())):
+                    self.drop(key)
+                    self.invalidations += 1
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+            self.generation += 1
+
+    def invalidate_commands(self):
+        """Drop the results of read-only commands, e.g. after a command that may write."""
+        with self.lock:
+            self.generation += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations
+        }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return f"Tool cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}), {stats['invalidations']} invalidations, {stats['entries']} entries"
+
+
+def from_env() -> ToolCache:
+    """Build the cache sized by `AGENT_TOOL_CACHE`, disabled when unset or 0, printing its stats at exit."""
+    cache = ToolCache(int(os.getenv("AGENT_TOOL_CACHE", "0")))
+    if cache.enabled:
+        atexit.register(lambda: print(cache.summary()))
+    return cache